@@ -0,0 +1,92 @@
+from bisect import bisect_left, bisect_right, insort
+"""Индексы каталога для фильтрации по жанру, цене и рейтингу"""
+
+class SortedIndex:
+    """Отсортированный по возрастанию список пар (значение, id) для поиска по диапазону"""
+    def __init__(self) -> None:
+        self._values: dict[int, float] = {}
+        self._keys: list[tuple[float, int]] = []
+
+    def update(self, item_id: int, value: float) -> None:
+        """Добавляет запись или меняет её значение"""
+        self.remove(item_id)
+        self._values[item_id] = value
+        insort(self._keys, (value, item_id))
+
+    def remove(self, item_id: int) -> None:
+        value = self._values.pop(item_id, None)
+        if value is None:
+            return
+        index = bisect_left(self._keys, (value, item_id))
+        del self._keys[index]
+
+    def build(self, values: dict[int, float]) -> None:
+        """Заполняет индекс заново одной сортировкой вместо вставки по одной записи"""
+        self._values = dict(values)
+        self._keys = sorted((value, item_id) for item_id, value in self._values.items())
+
+    def range(self, low: float | None = None, high: float | None = None) -> set[int]:
+        """ID записей со значением в отрезке [low, high]. None - без границы"""
+        return set(self.range_ids(low, high))
+
+    def range_ids(self, low: float | None = None, high: float | None = None) -> list[int]:
+        """То же, что range, но ID идут по возрастанию значения"""
+        start = 0 if low is None else bisect_left(self._keys, (low, float("-inf")))
+        end = len(self._keys) if high is None else bisect_right(self._keys, (high, float("inf")))
+        return [item_id for _, item_id in self._keys[start:end]]
+
+    def clear(self) -> None:
+        self._values.clear()
+        self._keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class CatalogIndex:
+    """Фасетный индекс книг: множества ID по жанрам + отсортированные цены и рейтинги"""
+    def __init__(self) -> None:
+        self.by_genre: dict[str, set[int]] = {}
+        self.by_price = SortedIndex()
+        self.by_rating = SortedIndex()
+
+    def add(self, book_id: int, genre: str, price: float, rating: float) -> None:
+        self.by_genre.setdefault(genre, set()).add(book_id)
+        self.by_price.update(book_id, price)
+        self.by_rating.update(book_id, rating)
+
+    def remove(self, book_id: int, genre: str) -> None:
+        genre_ids = self.by_genre.get(genre)
+        if genre_ids is not None:
+            genre_ids.discard(book_id)
+            if not genre_ids:
+                del self.by_genre[genre]
+        self.by_price.remove(book_id)
+        self.by_rating.remove(book_id)
+
+    def clear(self) -> None:
+        self.by_genre.clear()
+        self.by_price.clear()
+        self.by_rating.clear()
+
+    def query(self, genre: str | None = None,
+              min_price: float | None = None, max_price: float | None = None,
+              min_rating: float | None = None, max_rating: float | None = None) -> set[int] | None:
+        """Пересечение условий. None означает, что фильтров нет (подходят все книги)"""
+        candidates = []
+        if genre is not None:
+            candidates.append(self.by_genre.get(genre, set()))
+        if min_price is not None or max_price is not None:
+            candidates.append(self.by_price.range(min_price, max_price))
+        if min_rating is not None or max_rating is not None:
+            candidates.append(self.by_rating.range(min_rating, max_rating))
+        if not candidates:
+            return None
+        # Начинаем с самого маленького множества, чтобы пересечение было дешевле
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for ids in candidates[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import time
+"""Поток изменений магазина (change data capture).
+BookStore сообщает о каждом изменении событием: подписчики в том же процессе получают его сразу,
+а при сохранении события дописываются в NDJSON файл с возрастающими курсорами.
+Потребитель запоминает последний курсор и потом читает только то, что появилось после него"""
+
+# Типы событий
+BOOK_ADDED = "book_added"
+BOOK_DELETED = "book_deleted"
+BOOK_PRICE_CHANGED = "book_price_changed"
+AUTHOR_ADDED = "author_added"
+CUSTOMER_ADDED = "customer_added"
+BALANCE_CHANGED = "balance_changed"
+ORDER_CREATED = "order_created"
+ORDER_STATUS_CHANGED = "order_status_changed"
+
+
+class ChangeEvent:
+    """Одно изменение. cursor назначается при записи в файл и до этого равен None"""
+    __slots__ = ("type", "entity_id", "data", "created_at", "cursor")
+
+    def __init__(self, type: str, entity_id: int, data: dict, created_at: int | None = None,
+                 cursor: int | None = None) -> None:
+        self.type = type
+        self.entity_id = entity_id
+        self.data = data
+        self.created_at = int(time.time()) if created_at is None else created_at
+        self.cursor = cursor
+
+    def to_dict(self) -> dict:
+        return {"cursor": self.cursor, "type": self.type, "id": self.entity_id,
+                "created_at": self.created_at, "data": self.data}
+
+    @classmethod
+    def from_dict(cls, record: dict) -> "ChangeEvent":
+        return cls(record["type"], record["id"], record["data"], record["created_at"], record["cursor"])
+
+    def __repr__(self) -> str:
+        return f"ChangeEvent({self.cursor}, {self.type}, {self.entity_id}, {self.data})"
+
+
+class ChangeFeed:
+    """Рассылка событий подписчикам и очередь на запись в файл.
+    Если подписчиков нет и record выключен, emit ничего не делает - изменения не дорожают"""
+    def __init__(self) -> None:
+        # (обработчик, типы событий или None - все)
+        self._subscribers: list[tuple] = []
+        self.record = False
+        self._pending: list[ChangeEvent] = []
+
+    def subscribe(self, callback, types=None):
+        """callback(event) для каждого события (только типов types, если заданы).
+        Возвращает функцию отписки"""
+        subscriber = (callback, frozenset(types) if types is not None else None)
+        self._subscribers.append(subscriber)
+        return lambda: self._subscribers.remove(subscriber)
+
+    @property
+    def active(self) -> bool:
+        return self.record or bool(self._subscribers)
+
+    def emit(self, type: str, entity_id: int, **data) -> None:
+        if not self.active:
+            return
+        event = ChangeEvent(type, entity_id, data)
+        if self.record:
+            self._pending.append(event)
+        for callback, types in self._subscribers:
+            if types is None or type in types:
+                callback(event)
+
+    def flush(self, filename: str) -> int:
+        """Дописывает накопленные события в NDJSON файл и назначает им курсоры.
+        Курсор продолжает последний в файле, поэтому при записи под блокировкой папки данных
+        курсоры растут и при нескольких процессах. Возвращает число записанных событий"""
+        if not self._pending:
+            return 0
+        cursor = last_cursor(filename)
+        with open(filename, 'a', encoding='utf-8') as f:
+            for event in self._pending:
+                cursor += 1
+                event.cursor = cursor
+                f.write(json.dumps(event.to_dict(), ensure_ascii=False) + "\n")
+        count = len(self._pending)
+        self._pending.clear()
+        return count
+
+
+def last_cursor(filename: str) -> int:
+    """Курсор последнего события в файле (0, если файла нет). Читается только хвост файла"""
+    if not os.path.exists(filename):
+        return 0
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        block = 4096
+        while True:
+            start = max(end - block, 0)
+            f.seek(start)
+            lines = f.read(end - start).rstrip(b"\n").split(b"\n")
+            if len(lines) > 1 or start == 0:
+                return json.loads(lines[-1])["cursor"] if lines[-1] else 0
+            block *= 2
+
+
+def read_since(filename: str, cursor: int = 0):
+    """События с курсором больше cursor. Начало ищется бинарным поиском по смещениям в файле,
+    так что продолжение с последнего курсора не перечитывает весь поток"""
+    if not os.path.exists(filename):
+        return
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        low, high = 0, f.tell()
+        # Ищем смещение первой строки с курсором > cursor
+        while low < high:
+            middle = (low + high) // 2
+            f.seek(middle)
+            if middle:
+                f.readline()  # дочитываем неполную строку
+            line_start = f.tell()
+            line = f.readline()
+            if not line or json.loads(line)["cursor"] > cursor:
+                high = middle
+            else:
+                low = line_start + len(line)
+        f.seek(low)
+        if low:
+            f.seek(low - 1)
+            if f.read(1) != b"\n":
+                f.readline()
+        for line in f:
+            event = ChangeEvent.from_dict(json.loads(line))
+            if event.cursor > cursor:
+                yield event
+
+
+if __name__ == "__main__":
+    # Вывод событий после курсора: python changes.py data/changes.ndjson [курсор]
+    stream = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "changes.ndjson")
+    since = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    for change in read_since(stream, since):
+        print(json.dumps(change.to_dict(), ensure_ascii=False))
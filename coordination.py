@@ -0,0 +1,166 @@
+import json
+import os
+from exceptions import StaleData, MergeConflict
+from file_handlers import FileHandler, SECTIONS
+from models import BookStore
+"""Совместная работа нескольких процессов с одной папкой данных:
+блокировка файлов, версия данных на диске и выдача ID блоками"""
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Сколько ID одного вида процесс забирает за раз
+ID_BLOCK_SIZE = 1000
+
+
+class FileLock:
+    """Эксклюзивная рекомендательная блокировка файла между процессами.
+    Используется как with FileLock(path): ... Повторно в том же процессе не захватывать"""
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self._file = None
+
+    def acquire(self) -> None:
+        self._file = open(self.filename, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def release(self) -> None:
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class SharedDataDir:
+    """Общая для нескольких процессов папка данных.
+    В файле состояния лежат версия данных (растёт при каждом сохранении) и следующие свободные ID.
+    Загрузка и сохранение выполняются под lock(). Перед записью check_version() проверяет,
+    не сохранил ли кто-то данные после нашей загрузки - тогда можно объединить изменения (merge)"""
+    def __init__(self, data_dir: str, block_size: int = ID_BLOCK_SIZE) -> None:
+        self.state_file = os.path.join(data_dir, "store.state")
+        self.lock_file = os.path.join(data_dir, "store.lock")
+        self.block_size = block_size
+        self.loaded_version = 0
+        # Отпечатки записей на момент загрузки: секция -> {ID: хеш записи}
+        self._base: dict[str, dict[int, int]] = {}
+
+    def lock(self) -> FileLock:
+        return FileLock(self.lock_file)
+
+    def _read_state(self) -> dict:
+        if not os.path.exists(self.state_file):
+            return {"version": 0, "next_ids": {}}
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_state(self, state: dict) -> None:
+        # Пишем во временный файл и подменяем, чтобы состояние не осталось недописанным
+        temp_file = self.state_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_file, self.state_file)
+
+    def attach(self, bookstore: BookStore, fingerprints: dict | None = None) -> None:
+        """Вызывается под lock() сразу после загрузки: запоминает версию и состояние записей,
+        ID для новых объектов магазин теперь берёт блоками отсюда, начиная с нового блока.
+        fingerprints - уже посчитанные отпечатки записей (FileHandler.prepare_save)"""
+        self._remember(bookstore, fingerprints)
+        bookstore.id_blocks = self
+        bookstore._id_block_end.clear()
+
+    def _remember(self, bookstore: BookStore, fingerprints: dict | None) -> None:
+        """Версия на диске и отпечатки записей, с которыми сравнивается merge"""
+        self.loaded_version = self._read_state()["version"]
+        if fingerprints is None:
+            fingerprints = FileHandler.record_fingerprints(FileHandler._section_records(bookstore))
+        self._base = fingerprints
+
+    def reserve(self, kind: str, floor: int, count: int = 1) -> tuple[int, int]:
+        """Забирает блок ID вида kind не меньше floor. Возвращает (начало, конец блока)"""
+        with self.lock():
+            state = self._read_state()
+            start = max(state["next_ids"].get(kind, 1), floor)
+            end = start + max(count, self.block_size)
+            state["next_ids"][kind] = end
+            self._write_state(state)
+        return start, end
+
+    def check_version(self) -> None:
+        """Под lock() перед сохранением. StaleData, если данные уже сохранил другой процесс"""
+        disk_version = self._read_state()["version"]
+        if disk_version != self.loaded_version:
+            raise StaleData(self.loaded_version, disk_version)
+
+    def commit(self, bookstore: BookStore, fingerprints: dict | None = None) -> None:
+        """Под lock() после записи файлов: новая версия данных на диске.
+        fingerprints - отпечатки записанных записей, чтобы не считать их заново.
+        Текущий блок ID остаётся за магазином: иначе каждое сохранение выбрасывало бы его остаток"""
+        state = self._read_state()
+        state["version"] += 1
+        self._write_state(state)
+        self._remember(bookstore, fingerprints)
+
+    def merge(self, bookstore: BookStore, filename: str) -> BookStore:
+        """Под lock(): трёхстороннее объединение наших изменений с тем, что другой процесс сохранил в filename.
+        Изменённые, новые и удалённые нами записи берутся у нас, остальные - с диска.
+        Если запись изменили обе стороны (по-разному), MergeConflict и ничего не объединяется:
+        иначе, например, списание по заказу у другого процесса потерялось бы под нашим пополнением баланса.
+        Возвращает новый магазин; версию и записи считаем загруженными с диска, блоки ID - новыми"""
+        if filename.endswith(".xml"):
+            theirs = FileHandler._read_xml_data(filename)
+        else:
+            with open(filename, 'r', encoding='utf-8') as f:
+                theirs = json.load(f)
+        ours = FileHandler._section_records(bookstore)
+
+        merged = {"next_ids": {kind: max(theirs["next_ids"][kind], ours["next_ids"][kind])
+                               for kind in ours["next_ids"]}}
+        conflicts = []
+        disk_fingerprints = {}
+        for section in SECTIONS:
+            base = self._base.get(section, {})
+            our_fingerprints = FileHandler.record_fingerprints({section: ours[section]})[section]
+            their_fingerprints = FileHandler.record_fingerprints({section: theirs[section]})[section]
+            disk_fingerprints[section] = their_fingerprints
+            records = {FileHandler.record_id(record): record for record in theirs[section]}
+            for record in ours[section]:
+                record_id = FileHandler.record_id(record)
+                ours_now, theirs_now = our_fingerprints[record_id], their_fingerprints.get(record_id)
+                if base.get(record_id) != ours_now:
+                    if theirs_now != base.get(record_id) and theirs_now != ours_now:
+                        conflicts.append((section, record_id))
+                    records[record_id] = record
+            for record_id in base.keys() - our_fingerprints.keys():
+                # Мы удалили запись, а другой процесс её изменил
+                if their_fingerprints.get(record_id, base[record_id]) != base[record_id]:
+                    conflicts.append((section, record_id))
+                records.pop(record_id, None)
+            merged[section] = [records[record_id] for record_id in sorted(records)]
+        if conflicts:
+            raise MergeConflict(conflicts)
+
+        merged_store = FileHandler._build_bookstore(merged)
+        # Несохранённые записи журнала и события наши - переносим их в новый магазин
+        merged_store.ledger = bookstore.ledger
+        merged_store.changes = bookstore.changes
+        self.attach(merged_store, disk_fingerprints)
+        return merged_store
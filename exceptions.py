@@ -16,3 +16,27 @@ class InvalidPrice(Exception):
     def __init__(self, price: float):
         self.price = price
         super().__init__(f"Цена книги указанов не верно: {price}")
+class CatalogReadOnly(Exception):
+    """Каталог общий и только для чтения"""
+    def __init__(self):
+        super().__init__("Каталог общий для нескольких магазинов и доступен только для чтения")
+class DuplicateEmail(Exception):
+    """Покупатель с такой почтой уже есть"""
+    def __init__(self, email: str):
+        self.email = email
+        super().__init__(f"Покупатель с почтой {email} уже существует")
+class StaleData(Exception):
+    """Данные на диске изменил другой процесс"""
+    def __init__(self, loaded_version: int, disk_version: int):
+        self.loaded_version = loaded_version
+        self.disk_version = disk_version
+        super().__init__(f"Данные изменены другим процессом: загружена версия {loaded_version}, "
+                         f"на диске {disk_version}")
+class MergeConflict(Exception):
+    """Одни и те же записи изменены и нами, и другим процессом"""
+    def __init__(self, conflicts: list[tuple[str, int]]):
+        self.conflicts = conflicts
+        records = ", ".join(f"{section} #{record_id}" for section, record_id in conflicts[:10])
+        super().__init__(f"Записи изменены и здесь, и другим процессом: {records}"
+                         + (f" и ещё {len(conflicts) - 10}" if len(conflicts) > 10 else "")
+                         + ". Изменения не объединены - загрузите данные заново и повторите")
@@ -1,14 +1,70 @@
+import csv
+import hashlib
 import json
+import os
+from array import array
 import xml.etree.ElementTree as ET
-from models import BookStore, Book, Author, Customer, Order
+from concurrent.futures import ProcessPoolExecutor
+from models import (BookStore, Catalog, Book, Author, Customer, Order, OrderStatus, OrderSummary,
+                    parse_order_date, duplicate_emails)
+from text_search import FullTextIndex
+from ledger import Ledger
+
+# Сколько записей в одном куске файла при параллельной загрузке
+CHUNK_SIZE = 50_000
+SECTIONS = ("authors", "books", "customers", "orders")
+# Поля, которые при сравнении форматов приводим к float (в json число может быть записано как int)
+FLOAT_FIELDS = ("price", "rating", "balance", "total_price")
+
+
+def _parse_json_chunk(filename: str, section: str, start: int, end: int) -> list:
+    """Разбирает кусок JSON файла (записи одной секции). Выполняется в отдельном процессе"""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    return json.loads("[" + text + "]")
+
+
+def _parse_xml_chunk(filename: str, section: str, start: int, end: int) -> list:
+    """Разбирает кусок XML файла (записи одной секции). Выполняется в отдельном процессе"""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    chunk = ET.fromstring("<chunk>" + text + "</chunk>")
+    return [FileHandler._xml_record(section, elem) for elem in chunk]
+
+
+def _load_orders_chunk(filename: str, section: str, start: int, end: int) -> tuple[list, OrderSummary] | None:
+    """Разбирает кусок заказов и сразу делает то, что не требует остального магазина:
+    упаковывает строки заказов и считает сводку для индексов. Выполняется в отдельном процессе.
+    Возвращает ([(ID заказа, ID покупателя, статус, буфер)], сводка) или None для старого формата без цен"""
+    parse_chunk = _parse_xml_chunk if filename.endswith(".xml") else _parse_json_chunk
+    packed = []
+    summary = OrderSummary()
+    for record in parse_chunk(filename, section, start, end):
+        if record.get("prices") is None:
+            return None
+        created_at = record.get("created_at")
+        if created_at is None:
+            created_at = parse_order_date(record["order_date"])
+        status = OrderStatus.parse(record["status"])
+        total_price = record.get("total_price")
+        if total_price is None:
+            total_price = sum(record["prices"])
+        data = Order.pack_line_items(created_at, total_price, record["book_ids"], record["prices"])
+        packed.append((record["order_id"], record["customer_id"], status, data))
+        summary.add(record["order_id"], status, created_at, record["book_ids"])
+    return packed, summary
+
+
 class FileHandler:
     """Для работы с json и XML"""
 
     @staticmethod
-    def save_to_json_file(bookstore: BookStore, filename: str) -> None:
-        """Сохраняем в json"""
+    def _section_records(bookstore: BookStore) -> dict:
+        """Данные магазина по секциям в виде словарей (формат json)"""
         # Главный словарь с данными
-        data = {
+        return {
             # Сохраняем текущие счетчики ID
             "next_ids":{
                 "book": bookstore._next_book_id,
@@ -31,7 +87,7 @@ class FileHandler:
                     "book_id": book.book_id,
                     "title": book.title,
                     "author_id": book.author.author_id,  # сохраняем ID автора
-                    "price": book.price,
+                    "price": bookstore.get_price(book),  # цена в этом магазине
                     "genre": book.genre,
                     "rating": book.rating
                 }
@@ -54,7 +110,11 @@ class FileHandler:
                 {
                     "order_id": order.order_id,
                     "customer_id": order.customer.customer_id,
-                    "book_ids": [book.book_id for book in order.books],
+                    "book_ids": order.book_ids.tolist(),
+                    # Цены на момент заказа
+                    "prices": order.prices.tolist(),
+                    "created_at": order.created_at,
+                    # Дата строкой - для чтения человеком и старых версий программы
                     "order_date": order.order_date,
                     "status": order.status,
                     "total_price": order.total_price
@@ -62,217 +122,568 @@ class FileHandler:
                 for order in bookstore.orders
             ]
         }
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def _canonical_record(record: dict) -> dict:
+        """Запись в одинаковом для json и xml виде: числа-цены как float,
+        без пустых полей и без order_date (она выводится из created_at)"""
+        canonical = {}
+        for key, value in record.items():
+            if value is None or key == "order_date":
+                continue
+            if key in FLOAT_FIELDS:
+                value = float(value)
+            elif key == "prices":
+                value = [float(price) for price in value]
+            canonical[key] = value
+        return canonical
+
+    @staticmethod
+    def _record_text(record: dict) -> str:
+        return json.dumps(FileHandler._canonical_record(record), ensure_ascii=False, sort_keys=True,
+                          separators=(",", ":"))
+
+    @staticmethod
+    def _digest(data: dict) -> tuple[dict[str, str], dict[str, dict[int, int]]]:
+        """Хеши секций и отпечатки записей за один проход: каждая запись сериализуется один раз"""
+        hashes = {}
+        fingerprints = {}
+        for section, value in data.items():
+            records = [value] if section == "next_ids" else value
+            texts = [FileHandler._record_text(record) for record in records]
+            # То же, что json.dumps всего списка с теми же параметрами
+            hashes[section] = hashlib.sha256(("[" + ",".join(texts) + "]").encode('utf-8')).hexdigest()
+            if section in SECTIONS:
+                fingerprints[section] = {FileHandler.record_id(record): hash(text)
+                                         for record, text in zip(records, texts)}
+        return hashes, fingerprints
+
+    @staticmethod
+    def _section_hashes(data: dict) -> dict[str, str]:
+        """Хеш содержимого каждой секции (next_ids, authors, books, customers, orders)"""
+        return FileHandler._digest(data)[0]
+
+    @staticmethod
+    def prepare_save(bookstore: BookStore) -> tuple[dict, dict[str, str], dict[str, dict[int, int]]]:
+        """(записи по секциям, хеши секций, отпечатки записей) - считаются один раз на сохранение
+        и передаются обоим сохранениям и SharedDataDir.commit"""
+        data = FileHandler._section_records(bookstore)
+        hashes, fingerprints = FileHandler._digest(data)
+        return data, hashes, fingerprints
+
+    @staticmethod
+    def record_id(record: dict) -> int:
+        """ID записи любой секции (author_id, book_id, customer_id, order_id - первое поле)"""
+        return next(iter(record.values()))
+
+    @staticmethod
+    def record_fingerprints(data: dict) -> dict[str, dict[int, int]]:
+        """Хеш каждой записи по секциям: {секция: {ID: хеш}}. Нужен, чтобы понять, какие записи изменились"""
+        return {
+            section: {FileHandler.record_id(record): hash(FileHandler._record_text(record))
+                      for record in data[section]}
+            for section in SECTIONS if section in data
+        }
+
+    @staticmethod
+    def _is_unchanged(filename: str, hashes: dict[str, str]) -> bool:
+        """Файл на диске уже содержит ровно эти секции - писать его заново не нужно"""
+        manifest = FileHandler._load_manifest(filename)
+        return manifest is not None and manifest.get("hashes") == hashes
+
+    @staticmethod
+    def save_to_json_file(bookstore: BookStore, filename: str, prepared: tuple | None = None) -> bool:
+        """Сохраняем в json. Если ни одна секция не изменилась, файл не переписывается.
+        prepared - результат prepare_save, если он уже посчитан. Возвращает True, если файл был записан"""
+        data, hashes, _ = prepared or FileHandler.prepare_save(bookstore)
+        if FileHandler._is_unchanged(filename, hashes):
+            return False
+
+        # Пишем файл по кускам (результат такой же, как у json.dump с indent=2)
+        # и запоминаем смещения кусков для параллельной загрузки
+        def dumps(value, indent: str) -> str:
+            return json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n" + indent)
+
+        sections = {}
+        with open(filename, 'wb') as f:
+            f.write(b"{\n")
+            for number, (section, value) in enumerate(data.items()):
+                f.write(f"  {json.dumps(section)}: ".encode('utf-8'))
+                if section in SECTIONS and value:
+                    f.write(b"[\n")
+                    sections[section] = []
+                    for start in range(0, len(value), CHUNK_SIZE):
+                        if start:
+                            f.write(b",\n")
+                        chunk = value[start:start + CHUNK_SIZE]
+                        chunk_start = f.tell()
+                        f.write(",\n".join("    " + dumps(record, "    ") for record in chunk).encode('utf-8'))
+                        sections[section].append([chunk_start, f.tell()])
+                    f.write(b"\n  ]")
+                else:
+                    value_start = f.tell()
+                    f.write(dumps(value, "  ").encode('utf-8'))
+                    # next_ids целиком, пустые секции - без кусков
+                    sections[section] = [[value_start, f.tell()]] if section not in SECTIONS else []
+                f.write(b",\n" if number < len(data) - 1 else b"\n")
+            f.write(b"}")
+        FileHandler._save_manifest(filename, sections, hashes)
+        return True
+
     @staticmethod
-    def load_from_json_file(filename: str) -> BookStore:
-        """Загружаем данные из json"""
+    def load_from_json_file(filename: str, catalog: Catalog | None = None) -> BookStore:
+        """Загружаем данные из json. Если передан общий каталог, авторы и книги берутся из него"""
         with open(filename, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            bookstore = BookStore()
-            # Восстанавливаем счетчики ID
-            bookstore._next_book_id = data["next_ids"]["book"]
-            bookstore._next_author_id = data["next_ids"]["author"]
-            bookstore._next_customer_id = data["next_ids"]["customer"]
-            bookstore._next_order_id = data["next_ids"]["order"]
-
-            # Сначала создаем авторов (они нужны для книг)
-            authors_dict = {} #словарь для посика автора по айди
-            for author_data in data["authors"]:
-                author = Author(author_data["author_id"], author_data["name"], author_data["country"])
-                bookstore.authors.append(author)
-                authors_dict[author_data["author_id"]] = author
-
-            # Создаем книги
-            books_dict = {}
+        return FileHandler._build_bookstore(data, catalog)
+
+    @staticmethod
+    def _build_catalog(data: dict) -> Catalog:
+        """Собирает каталог (авторы и книги) из словарей. Индексы не строятся"""
+        catalog = Catalog()
+        # Восстанавливаем счетчики ID
+        catalog.next_book_id = data["next_ids"]["book"]
+        catalog.next_author_id = data["next_ids"]["author"]
+
+        # Сначала создаем авторов (они нужны для книг)
+        authors_dict = {} #словарь для посика автора по айди
+        for author_data in data["authors"]:
+            author = Author(author_data["author_id"], author_data["name"], author_data["country"])
+            catalog.authors.append(author)
+            authors_dict[author_data["author_id"]] = author
+
+        # Создаем книги
+        for book_data in data["books"]:
+            # Находим автора по сохраненному ID
+            author = authors_dict[book_data["author_id"]]
+            book = Book(book_data["book_id"], book_data["title"], author,
+                        book_data["price"], book_data["genre"], book_data.get("rating", 0.0))
+            catalog.books.append(book)
+        return catalog
+
+    @staticmethod
+    def _build_bookstore(data: dict, catalog: Catalog | None = None,
+                         packed_orders: list | None = None, summary: OrderSummary | None = None) -> BookStore:
+        """Собирает магазин из словарей (формат как в json) и восстанавливает связи по ID.
+        С общим каталогом книги файла не создаются: отличающиеся цены становятся ценами магазина.
+        packed_orders и summary - заказы, уже упакованные и сведённые в процессах загрузки"""
+        shared = catalog is not None
+        if catalog is None:
+            catalog = FileHandler._build_catalog(data)
+        bookstore = BookStore(catalog)
+        bookstore._next_customer_id = data["next_ids"]["customer"]
+        bookstore._next_order_id = data["next_ids"]["order"]
+
+        # У общего каталога индексы уже построены, у нового - ещё нет
+        books_dict = catalog._books_by_id if shared else {book.book_id: book for book in catalog.books}
+        if shared:
             for book_data in data["books"]:
-                # Находим автора по сохраненному ID
-                author = authors_dict[book_data["author_id"]]
-                book = Book(book_data["book_id"], book_data["title"], author,
-                            book_data["price"], book_data["genre"], book_data.get("rating", 0.0))
-                bookstore.books.append(book)
-                books_dict[book_data["book_id"]] = book
-
-            # Создаем покупателей
-            customers_dict = {}
-            for customer_data in data["customers"]:
-                customer = Customer(customer_data["customer_id"], customer_data["name"],
-                                    customer_data["email"], customer_data["balance"])
-                bookstore.customers.append(customer)
-                customers_dict[customer_data["customer_id"]] = customer
-
-                # Восстанавливаем купленные книги
-                for book_id in customer_data["purchased_book_ids"]:
-                    if book_id in books_dict:
-                        customer.purchased_books.append(books_dict[book_id])
-
-            # Создаем заказы
-            for order_data in data["orders"]:
-                customer = customers_dict[order_data["customer_id"]]
-                books = [books_dict[book_id] for book_id in order_data["book_ids"] if book_id in books_dict]
-
-                order = Order(order_data["order_id"], customer, books)
-                order.order_date = order_data["order_date"]
-                order.status = order_data["status"]
-                order.total_price = order_data["total_price"]
-
-                bookstore.orders.append(order)
+                book = books_dict.get(book_data["book_id"])
+                if book is not None and book.price != book_data["price"]:
+                    bookstore.price_overrides[book.book_id] = book_data["price"]
+
+        # Создаем покупателей
+        customers_dict = {}
+        for customer_data in data["customers"]:
+            customer = Customer(customer_data["customer_id"], customer_data["name"],
+                                customer_data["email"], customer_data["balance"])
+            bookstore.customers.append(customer)
+            customers_dict[customer_data["customer_id"]] = customer
+
+            # Восстанавливаем купленные книги
+            for book_id in customer_data["purchased_book_ids"]:
+                if book_id in books_dict:
+                    customer.purchased_books.append(books_dict[book_id])
 
+        if packed_orders is not None:
+            bookstore.orders = [Order.from_packed(order_id, customers_dict[customer_id], status, order_data)
+                                for order_id, customer_id, status, order_data in packed_orders]
+            bookstore.rebuild_indexes(summary)
             return bookstore
 
+        # Создаем заказы
+        for order_data in data["orders"]:
+            customer = customers_dict[order_data["customer_id"]]
+            book_ids = order_data["book_ids"]
+            prices = order_data.get("prices")
+            if prices is None:
+                # Старый формат без цен: берём текущие цены книг
+                book_ids, prices = FileHandler._migrate_line_items(book_ids, books_dict)
+
+            created_at = order_data.get("created_at")
+            if created_at is None:
+                # Старый формат: только строка с датой
+                created_at = parse_order_date(order_data["order_date"])
+
+            order = Order.from_line_items(order_data["order_id"], customer, book_ids, prices,
+                                          created_at, order_data["status"],
+                                          order_data["total_price"])
+            bookstore.orders.append(order)
+
+        bookstore.rebuild_indexes()
+        return bookstore
+
+    @staticmethod
+    def _author_element(author: Author) -> ET.Element:
+        author_elem = ET.Element("author")
+        ET.SubElement(author_elem, "id").text = str(author.author_id)
+        ET.SubElement(author_elem, "name").text = author.name
+        ET.SubElement(author_elem, "country").text = author.country
+        return author_elem
+
+    @staticmethod
+    def _book_element(book: Book, price: float) -> ET.Element:
+        book_elem = ET.Element("book")
+        ET.SubElement(book_elem, "id").text = str(book.book_id)
+        ET.SubElement(book_elem, "title").text = book.title
+        ET.SubElement(book_elem, "author_id").text = str(book.author.author_id)
+        ET.SubElement(book_elem, "price").text = str(price)
+        ET.SubElement(book_elem, "genre").text = book.genre
+        ET.SubElement(book_elem, "rating").text = str(book.rating)
+        return book_elem
+
+    @staticmethod
+    def _customer_element(customer: Customer) -> ET.Element:
+        customer_elem = ET.Element("customer")
+        ET.SubElement(customer_elem, "id").text = str(customer.customer_id)
+        ET.SubElement(customer_elem, "name").text = customer.name
+        ET.SubElement(customer_elem, "email").text = customer.email
+        ET.SubElement(customer_elem, "balance").text = str(customer.balance)
+        # Сохраняем ID купленных книг
+        purchased_books = ET.SubElement(customer_elem, "purchased_books")
+        for book in customer.purchased_books:
+            ET.SubElement(purchased_books, "book_id").text = str(book.book_id)
+        return customer_elem
+
+    @staticmethod
+    def _order_element(order: Order) -> ET.Element:
+        order_elem = ET.Element("order")
+        ET.SubElement(order_elem, "id").text = str(order.order_id)
+        ET.SubElement(order_elem, "customer_id").text = str(order.customer.customer_id)
+        ET.SubElement(order_elem, "created_at").text = str(order.created_at)
+        ET.SubElement(order_elem, "order_date").text = order.order_date
+        ET.SubElement(order_elem, "status").text = order.status
+        ET.SubElement(order_elem, "total_price").text = str(order.total_price)
+        # Сохраняем ID книг в заказе и цены на момент заказа
+        books_elem = ET.SubElement(order_elem, "books")
+        for book_id, price in order.line_items():
+            ET.SubElement(books_elem, "book_id", price=str(price)).text = str(book_id)
+        return order_elem
+
     @staticmethod
-    def save_to_xml_file(bookstore: BookStore, filename: str) -> None:
-        """Сохраняет данные магазина в XML файл"""
-        root = ET.Element("bookstore") # корневой элемент
+    def save_to_xml_file(bookstore: BookStore, filename: str, prepared: tuple | None = None) -> bool:
+        """Сохраняет данные магазина в XML файл.
+        Каждая запись сериализуется отдельно, смещения кусков запоминаются для параллельной загрузки.
+        Если ни одна секция не изменилась, файл не переписывается. prepared - результат prepare_save.
+        Возвращает True, если файл был записан"""
+        _, hashes, _ = prepared or FileHandler.prepare_save(bookstore)
+        if FileHandler._is_unchanged(filename, hashes):
+            return False
 
         # Сохраняем счетчики ID
-        next_ids = ET.SubElement(root, "next_ids")
+        next_ids = ET.Element("next_ids")
         ET.SubElement(next_ids, "book").text = str(bookstore._next_book_id)
         ET.SubElement(next_ids, "author").text = str(bookstore._next_author_id)
         ET.SubElement(next_ids, "customer").text = str(bookstore._next_customer_id)
         ET.SubElement(next_ids, "order").text = str(bookstore._next_order_id)
 
-        # Сохраняем авторов
-        authors_elem = ET.SubElement(root, "authors")
-        for author in bookstore.authors:
-            author_elem = ET.SubElement(authors_elem, "author")
-            ET.SubElement(author_elem, "id").text = str(author.author_id)
-            ET.SubElement(author_elem, "name").text = author.name
-            ET.SubElement(author_elem, "country").text = author.country
-
-        # Сохраняем книги
-        books_elem = ET.SubElement(root, "books")
-        for book in bookstore.books:
-            book_elem = ET.SubElement(books_elem, "book")
-            ET.SubElement(book_elem, "id").text = str(book.book_id)
-            ET.SubElement(book_elem, "title").text = book.title
-            ET.SubElement(book_elem, "author_id").text = str(book.author.author_id)
-            ET.SubElement(book_elem, "price").text = str(book.price)
-            ET.SubElement(book_elem, "genre").text = book.genre
-            ET.SubElement(book_elem, "rating").text = str(book.rating)
-
-        # Покупатели
-        customers_elem = ET.SubElement(root, "customers")
-        for customer in bookstore.customers:
-            customer_elem = ET.SubElement(customers_elem, "customer")
-            ET.SubElement(customer_elem, "id").text = str(customer.customer_id)
-            ET.SubElement(customer_elem, "name").text = customer.name
-            ET.SubElement(customer_elem, "email").text = customer.email
-            ET.SubElement(customer_elem, "balance").text = str(customer.balance)
-            # Сохраняем ID купленных книг
-            purchased_books = ET.SubElement(customer_elem, "purchased_books")
-            for book in customer.purchased_books:
-                ET.SubElement(purchased_books, "book_id").text = str(book.book_id)
+        # Секции: (тег, записи, как превратить запись в элемент)
+        sections_data = (
+            ("authors", bookstore.authors, FileHandler._author_element),
+            ("books", bookstore.books, lambda book: FileHandler._book_element(book, bookstore.get_price(book))),
+            ("customers", bookstore.customers, FileHandler._customer_element),
+            ("orders", bookstore.orders, FileHandler._order_element),
+        )
+
+        sections = {}
+        with open(filename, 'wb') as f:
+            f.write(b"<?xml version='1.0' encoding='utf-8'?>\n<bookstore>")
+            next_ids_start = f.tell()
+            f.write(ET.tostring(next_ids, encoding="unicode").encode('utf-8'))
+            sections["next_ids"] = [[next_ids_start, f.tell()]]
+
+            for section, records, to_element in sections_data:
+                sections[section] = []
+                if not records:
+                    f.write(f"<{section} />".encode('utf-8'))
+                    continue
+                f.write(f"<{section}>".encode('utf-8'))
+                for start in range(0, len(records), CHUNK_SIZE):
+                    chunk_start = f.tell()
+                    f.write("".join(ET.tostring(to_element(record), encoding="unicode")
+                                    for record in records[start:start + CHUNK_SIZE]).encode('utf-8'))
+                    sections[section].append([chunk_start, f.tell()])
+                f.write(f"</{section}>".encode('utf-8'))
+            f.write(b"</bookstore>")
+        FileHandler._save_manifest(filename, sections, hashes)
+        return True
 
+    @staticmethod
+    def _xml_record(section: str, elem: ET.Element) -> dict:
+        """Переводит элемент XML в словарь того же вида, что и запись в json"""
+        if section == "next_ids":
+            return {child.tag: int(child.text) for child in elem}
+        if section == "authors":
+            return {
+                "author_id": int(elem.find("id").text),
+                "name": elem.find("name").text,
+                "country": elem.find("country").text
+            }
+        if section == "books":
+            return {
+                "book_id": int(elem.find("id").text),
+                "title": elem.find("title").text,
+                "author_id": int(elem.find("author_id").text),
+                "price": float(elem.find("price").text),
+                "genre": elem.find("genre").text,
+                "rating": float(elem.find("rating").text)
+            }
+        if section == "customers":
+            return {
+                "customer_id": int(elem.find("id").text),
+                "name": elem.find("name").text,
+                "email": elem.find("email").text,
+                "balance": float(elem.find("balance").text),
+                "purchased_book_ids": [int(book_id_elem.text)
+                                       for book_id_elem in elem.find("purchased_books").findall("book_id")]
+            }
         # Заказы
-        orders_elem = ET.SubElement(root, "orders")
-        for order in bookstore.orders:
-            order_elem = ET.SubElement(orders_elem, "order")
-            ET.SubElement(order_elem, "id").text = str(order.order_id)
-            ET.SubElement(order_elem, "customer_id").text = str(order.customer.customer_id)
-            ET.SubElement(order_elem, "order_date").text = order.order_date
-            ET.SubElement(order_elem, "status").text = order.status
-            ET.SubElement(order_elem, "total_price").text = str(order.total_price)
-            # Сохраняем ID книг в заказе
-            books_elem = ET.SubElement(order_elem, "books")
-            for book in order.books:
-                ET.SubElement(books_elem, "book_id").text = str(book.book_id)
-
-        tree = ET.ElementTree(root) # Сохраняяем дерево XML
-        tree.write(filename, encoding='utf-8', xml_declaration=True) # Сохраняем в файл
-    def load_from_xml_file(filename: str) -> BookStore:
-        # Загружаем данные из xml
+        book_id_elems = elem.find("books").findall("book_id")
+        prices = None
+        if all("price" in book_id_elem.attrib for book_id_elem in book_id_elems):
+            prices = [float(book_id_elem.get("price")) for book_id_elem in book_id_elems]
+        created_at_elem = elem.find("created_at")
+        return {
+            "order_id": int(elem.find("id").text),
+            "customer_id": int(elem.find("customer_id").text),
+            "book_ids": [int(book_id_elem.text) for book_id_elem in book_id_elems],
+            # В старых файлах нет цен и created_at - тогда None
+            "prices": prices,
+            "created_at": int(created_at_elem.text) if created_at_elem is not None else None,
+            "order_date": elem.find("order_date").text,
+            "status": elem.find("status").text,
+            "total_price": float(elem.find("total_price").text)
+        }
+
+    @staticmethod
+    def _read_xml_data(filename: str) -> dict:
+        """Читает XML в словари по секциям (формат json), без создания объектов магазина"""
         # Парсим XML файл
         tree = ET.parse(filename)
         root = tree.getroot()
 
-        # Создаем новый магазин
-        bookstore = BookStore()
+        data = {"next_ids": FileHandler._xml_record("next_ids", root.find("next_ids"))}
+        for section in SECTIONS:
+            data[section] = [FileHandler._xml_record(section, elem) for elem in root.find(section)]
+        return data
 
-        # Словари для быстрого доступа
-        authors_dict = {}
-        books_dict = {}
-        customers_dict = {}
+    @staticmethod
+    def load_from_xml_file(filename: str, catalog: Catalog | None = None) -> BookStore:
+        """Загружаем данные из xml. Если передан общий каталог, авторы и книги берутся из него"""
+        return FileHandler._build_bookstore(FileHandler._read_xml_data(filename), catalog)
 
-        # 1. Восстанавливаем счетчики ID
-        next_ids = root.find("next_ids")
-        bookstore._next_book_id = int(next_ids.find("book").text)
-        bookstore._next_author_id = int(next_ids.find("author").text)
-        bookstore._next_customer_id = int(next_ids.find("customer").text)
-        bookstore._next_order_id = int(next_ids.find("order").text)
-
-        # 2. Восстанавливаем авторов
-        authors_elem = root.find("authors")
-        for author_elem in authors_elem.findall("author"):
-            author_id = int(author_elem.find("id").text)
-            name = author_elem.find("name").text
-            country = author_elem.find("country").text
-
-            author = Author(author_id, name, country)
-            bookstore.authors.append(author)
-            authors_dict[author_id] = author
-
-        # 3. Восстанавливаем книги
-        books_elem = root.find("books")
-        for book_elem in books_elem.findall("book"):
-            book_id = int(book_elem.find("id").text)
-            title = book_elem.find("title").text
-            author_id = int(book_elem.find("author_id").text)
-            price = float(book_elem.find("price").text)
-            genre = book_elem.find("genre").text
-            rating = float(book_elem.find("rating").text)
-
-            author = authors_dict[author_id]
-            book = Book(book_id, title, author, price, genre, rating)
-            bookstore.books.append(book)
-            books_dict[book_id] = book
-
-        # 4. Восстанавливаем покупателей
-        customers_elem = root.find("customers")
-        for customer_elem in customers_elem.findall("customer"):
-            customer_id = int(customer_elem.find("id").text)
-            name = customer_elem.find("name").text
-            email = customer_elem.find("email").text
-            balance = float(customer_elem.find("balance").text)
-
-            customer = Customer(customer_id, name, email, balance)
-            bookstore.customers.append(customer)
-            customers_dict[customer_id] = customer
+    @staticmethod
+    def load_catalog(filename: str) -> Catalog:
+        """Загружает из json или xml только каталог и замораживает его,
+        чтобы один объект можно было отдать нескольким магазинам"""
+        if filename.endswith(".xml"):
+            data = FileHandler._read_xml_data(filename)
+        else:
+            with open(filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        catalog = FileHandler._build_catalog(data)
+        catalog.rebuild_indexes()
+        catalog.freeze()
+        return catalog
 
-            # Восстанавливаем купленные книги
-            purchased_books_elem = customer_elem.find("purchased_books")
-            for book_id_elem in purchased_books_elem.findall("book_id"):
-                book_id = int(book_id_elem.text)
-                if book_id in books_dict:
-                    customer.purchased_books.append(books_dict[book_id])
+    @staticmethod
+    def compare_files(json_filename: str, xml_filename: str) -> dict[str, bool]:
+        """Проверка, что json и xml содержат одно и то же: {секция: совпадает ли}.
+        Хеши считаются по тому, что записано в файлы (разбор файла), а не по данным магазина до записи,
+        иначе расхождение сериализаторов не заметить. Разбор кэшируется в манифесте до следующей записи"""
+        json_hashes = FileHandler._file_hashes(json_filename)
+        xml_hashes = FileHandler._file_hashes(xml_filename)
+        return {section: json_hashes.get(section) == xml_hashes.get(section)
+                for section in ("next_ids",) + SECTIONS}
 
-        # 5. Восстанавливаем заказы
-        orders_elem = root.find("orders")
-        for order_elem in orders_elem.findall("order"):
-            order_id = int(order_elem.find("id").text)
-            customer_id = int(order_elem.find("customer_id").text)
-            order_date = order_elem.find("order_date").text
-            status = order_elem.find("status").text
-            total_price = float(order_elem.find("total_price").text)
-
-            customer = customers_dict[customer_id]
-
-            # Восстанавливаем книги в заказе
-            books_elem = order_elem.find("books")
-            books = []
-            for book_id_elem in books_elem.findall("book_id"):
-                book_id = int(book_id_elem.text)
-                if book_id in books_dict:
-                    books.append(books_dict[book_id])
+    @staticmethod
+    def find_duplicate_emails(filename: str) -> dict[str, list[int]]:
+        """Отчёт о повторяющихся почтах в файле данных (json или xml) без создания магазина"""
+        if filename.endswith(".xml"):
+            customers = FileHandler._read_xml_data(filename)["customers"]
+        else:
+            with open(filename, 'r', encoding='utf-8') as f:
+                customers = json.load(f)["customers"]
+        return duplicate_emails((customer["customer_id"], customer["email"]) for customer in customers)
 
-            order = Order(order_id, customer, books)
-            order.order_date = order_date
-            order.status = status
-            order.total_price = total_price
+    @staticmethod
+    def load_credits(filename: str) -> tuple[array, array]:
+        """Читает CSV начислений: строки "ID покупателя,сумма", заголовок необязателен.
+        Весь файл разбирается до применения, ошибка формата - ValueError с номером строки"""
+        customer_ids = array("q")
+        amounts = array("d")
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            for line_number, row in enumerate(csv.reader(f), 1):
+                if not row:
+                    continue
+                try:
+                    customer_id, amount = int(row[0]), float(row[1])
+                except (ValueError, IndexError):
+                    if line_number == 1:
+                        continue  # заголовок
+                    raise ValueError(f"Строка {line_number}: ожидается ID покупателя и сумма")
+                customer_ids.append(customer_id)
+                amounts.append(amount)
+        return customer_ids, amounts
 
-            bookstore.orders.append(order)
+    @staticmethod
+    def load_ledger(filename: str) -> Ledger:
+        """Читает CSV журнала, записанный append_ledger. Все записи считаются уже сохранёнными"""
+        ledger = Ledger()
+        if not os.path.exists(filename):
+            return ledger
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # заголовок
+            for created_at, customer_id, kind, amount, order_id in reader:
+                ledger.record(int(customer_id), float(amount), kind, int(order_id), int(created_at))
+        ledger.flushed = len(ledger)
+        return ledger
+
+    @staticmethod
+    def append_ledger(ledger: Ledger, filename: str) -> int:
+        """Дописывает в CSV журнала записи, которых там ещё нет. Возвращает их число"""
+        if ledger.flushed >= len(ledger):
+            return 0
+        write_header = not os.path.exists(filename)
+        with open(filename, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(("created_at", "customer_id", "kind", "amount", "order_id"))
+            writer.writerows(ledger.rows(ledger.flushed))
+        count = len(ledger) - ledger.flushed
+        ledger.flushed = len(ledger)
+        return count
+
+    @staticmethod
+    def _file_hashes(filename: str) -> dict[str, str]:
+        """Хеши секций по содержимому файла. Посчитанные разбором хеши запоминаются в манифесте
+        (file_hashes) и годятся, пока файл не переписан - запись создаёт манифест заново"""
+        manifest = FileHandler._load_manifest(filename)
+        if manifest is not None and manifest.get("file_hashes"):
+            return manifest["file_hashes"]
+        if filename.endswith(".xml"):
+            hashes = FileHandler._section_hashes(FileHandler._read_xml_data(filename))
+        else:
+            with open(filename, 'r', encoding='utf-8') as f:
+                hashes = FileHandler._section_hashes(json.load(f))
+        if manifest is not None:
+            manifest["file_hashes"] = hashes
+            with open(FileHandler._manifest_filename(filename), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+        return hashes
+
+    @staticmethod
+    def _manifest_filename(filename: str) -> str:
+        return filename + ".manifest"
+
+    @staticmethod
+    def _save_manifest(filename: str, sections: dict, hashes: dict[str, str]) -> None:
+        """Сохраняет рядом с файлом данных смещения кусков и хеши секций"""
+        manifest = {
+            "source": FileHandler._source_signature(filename),
+            "sections": sections,
+            "hashes": hashes
+        }
+        with open(FileHandler._manifest_filename(filename), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+    @staticmethod
+    def _load_manifest(filename: str) -> dict | None:
+        """Манифест файла, если он относится к текущей версии файла, иначе None"""
+        if not os.path.exists(filename):
+            return None
+        manifest_filename = FileHandler._manifest_filename(filename)
+        if not os.path.exists(manifest_filename):
+            return None
+        with open(manifest_filename, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("source") != FileHandler._source_signature(filename):
+            return None
+        return manifest
+
+    @staticmethod
+    def load_parallel(filename: str, workers: int | None = None, catalog: Catalog | None = None) -> BookStore:
+        """Параллельная загрузка json или xml: куски файла разбираются в пуле процессов.
+        Заказы (самая большая секция) там же упаковываются и сводятся в OrderSummary, поэтому
+        здесь остаётся связать объекты по ID и собрать индексы из готовых сводок.
+        Если смещений нет или файл менялся после сохранения - обычная загрузка"""
+        is_xml = filename.endswith(".xml")
+        manifest = FileHandler._load_manifest(filename)
+        if manifest is None:
+            if is_xml:
+                return FileHandler.load_from_xml_file(filename, catalog)
+            return FileHandler.load_from_json_file(filename, catalog)
+
+        parse_chunk = _parse_xml_chunk if is_xml else _parse_json_chunk
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            order_futures = [pool.submit(_load_orders_chunk, filename, "orders", start, end)
+                             for start, end in manifest["sections"].get("orders", [])]
+            futures = {section: [pool.submit(parse_chunk, filename, section, start, end)
+                                 for start, end in chunks]
+                       for section, chunks in manifest["sections"].items() if section != "orders"}
+            data = {section: [record for future in section_futures for record in future.result()]
+                    for section, section_futures in futures.items()}
+            order_chunks = [future.result() for future in order_futures]
+        data["next_ids"] = data["next_ids"][0]
+
+        if any(chunk is None for chunk in order_chunks):
+            # Старый формат заказов: цены берутся из книг, это делает обычная сборка
+            if is_xml:
+                return FileHandler.load_from_xml_file(filename, catalog)
+            return FileHandler.load_from_json_file(filename, catalog)
+        packed_orders = []
+        summary = OrderSummary()
+        for chunk_orders, chunk_summary in order_chunks:
+            packed_orders.extend(chunk_orders)
+            summary.merge(chunk_summary)
+        data["orders"] = []
+        return FileHandler._build_bookstore(data, catalog, packed_orders, summary)
+
+    @staticmethod
+    def _migrate_line_items(book_ids: list[int], books_dict: dict[int, Book]) -> tuple[list[int], list[float]]:
+        """Строки заказа для файлов старого формата (только book_ids).
+        Цена на момент заказа не сохранялась, поэтому берём текущую цену книги"""
+        known_ids = [book_id for book_id in book_ids if book_id in books_dict]
+        return known_ids, [books_dict[book_id].price for book_id in known_ids]
+
+    @staticmethod
+    def _source_signature(source_filename: str) -> list[int]:
+        """Размер и время изменения файла с данными, чтобы понять, устарел ли индекс"""
+        stat = os.stat(source_filename)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def save_search_index(index: FullTextIndex, filename: str, source_filename: str) -> None:
+        """Сохраняет полнотекстовый индекс рядом с файлом данных"""
+        data = {
+            "source": FileHandler._source_signature(source_filename),
+            "index": index.to_dict()
+        }
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @staticmethod
+    def load_search_index(filename: str, source_filename: str) -> FullTextIndex | None:
+        """Загружает индекс, если он построен по текущей версии файла данных, иначе None"""
+        if not os.path.exists(filename) or not os.path.exists(source_filename):
+            return None
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("source") != FileHandler._source_signature(source_filename):
+            return None
+        return FullTextIndex.from_dict(data["index"])
 
-        return bookstore
 
 if __name__ == "__main__":
     print("Тестируем работу с файлами")
@@ -387,8 +798,8 @@ if __name__ == "__main__":
         print(f"     Покупатель: {order.customer.name}")
         print(f"     Статус: {order.status}")
         print(f"     Сумма: {order.total_price} руб.")
-        print(f"     Книг в заказе: {len(order.books)}")
-        for book in order.books:
+        print(f"     Книг в заказе: {len(order.book_ids)}")
+        for book in store_from_xml.get_order_books(order):
             print(f"       - {book.title}")
 
     # ТЕСТ 3: Сравниваем данные из JSON и XML
@@ -414,6 +825,11 @@ if __name__ == "__main__":
         print(f"Названия совпадают: {'Да' if json_first_book.title == xml_first_book.title else 'Нет'}")
         print(f"Цены совпадают: {'Да' if json_first_book.price == xml_first_book.price else 'Нет'}")
 
+    # Сравниваем секции по хешам содержимого
+    print("\nСравнение секций по хешам:")
+    for section, same in FileHandler.compare_files("data/books.json", "data/books.xml").items():
+        print(f"  {section}: {'Совпадает' if same else 'Ошибка'}")
+
     # Проверяем счетчики ID
     print(f"\nСчетчики ID после загрузки:")
     print(f"  JSON - Следующий ID книги: {store_from_json._next_book_id}")
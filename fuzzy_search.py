@@ -0,0 +1,101 @@
+import heapq
+"""Нечёткий поиск с опечатками (BK-дерево по расстоянию Левенштейна)"""
+
+def levenshtein(first: str, second: str) -> int:
+    """Расстояние Левенштейна: сколько вставок, удалений и замен нужно"""
+    if len(first) < len(second):
+        first, second = second, first
+    previous = list(range(len(second) + 1))
+    for i, char_first in enumerate(first, 1):
+        current = [i]
+        for j, char_second in enumerate(second, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (char_first != char_second)))
+        previous = current
+    return previous[-1]
+
+
+def normalize(text: str) -> str:
+    return text.casefold().replace("ё", "е").strip()
+
+
+class BKTree:
+    """BK-дерево: у каждого узла дети разложены по расстоянию до него.
+    При поиске с допуском d обходим только детей на расстоянии [dist - d, dist + d]"""
+    def __init__(self) -> None:
+        self._root: list | None = None  # [слово, множество id, {расстояние: узел}]
+
+    def add(self, word: str, item_id: int) -> None:
+        if self._root is None:
+            self._root = [word, {item_id}, {}]
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                node[1].add(item_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [word, {item_id}, {}]
+                return
+            node = child
+
+    def remove(self, word: str, item_id: int) -> None:
+        """Убирает id из узла. Сам узел остаётся, он нужен для навигации"""
+        node = self._root
+        while node is not None:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                node[1].discard(item_id)
+                return
+            node = node[2].get(distance)
+
+    def search(self, word: str, max_distance: int) -> dict[int, int]:
+        """Все id в пределах max_distance: {id: лучшее расстояние}"""
+        found: dict[int, int] = {}
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = levenshtein(word, node[0])
+            if distance <= max_distance:
+                for item_id in node[1]:
+                    if distance < found.get(item_id, max_distance + 1):
+                        found[item_id] = distance
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class FuzzyIndex:
+    """Нечёткий индекс строк: в дерево кладём всю строку и каждое слово отдельно,
+    чтобы "Достоевскй" находил "Фёдор Достоевский" """
+    MIN_WORD_LENGTH = 3
+
+    def __init__(self) -> None:
+        self._tree = BKTree()
+
+    def _keys(self, text: str) -> set[str]:
+        text = normalize(text)
+        words = {word for word in text.split() if len(word) >= self.MIN_WORD_LENGTH}
+        return words | {text}
+
+    def add(self, item_id: int, text: str) -> None:
+        for key in self._keys(text):
+            self._tree.add(key, item_id)
+
+    def remove(self, item_id: int, text: str) -> None:
+        for key in self._keys(text):
+            self._tree.remove(key, item_id)
+
+    def search(self, query: str, max_distance: int | None = None, k: int = 10) -> list[tuple[int, int]]:
+        """Лучшие k совпадений [(id, расстояние)]. По умолчанию допуск - 1 опечатка на 4 буквы"""
+        query = normalize(query)
+        if not query:
+            return []
+        if max_distance is None:
+            max_distance = max(1, len(query) // 4)
+        found = self._tree.search(query, max_distance)
+        return heapq.nsmallest(k, found.items(), key=lambda item: (item[1], item[0]))
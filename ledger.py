@@ -0,0 +1,54 @@
+import time
+from array import array
+"""Журнал движения денег покупателей: только добавление записей.
+Customer.balance - закэшированный итог, журнал - история начислений и списаний"""
+
+# Виды записей; в журнале хранится номер вида
+KINDS = ("opening", "topup", "promo", "refund", "order", "order_refund")
+
+
+class Ledger:
+    """Записи журнала в колонках: время, покупатель, вид, сумма, заказ (0 - без заказа).
+    Колонки - упакованные массивы, поэтому миллионы записей занимают немного памяти"""
+    def __init__(self) -> None:
+        self.created_at = array("q")
+        self.customer_ids = array("q")
+        self.kinds = array("b")
+        self.amounts = array("d")
+        self.order_ids = array("q")
+        # Сколько записей уже дописано в файл журнала
+        self.flushed = 0
+
+    def record(self, customer_id: int, amount: float, kind: str, order_id: int = 0,
+               created_at: int | None = None) -> None:
+        self.created_at.append(int(time.time()) if created_at is None else created_at)
+        self.customer_ids.append(customer_id)
+        self.kinds.append(KINDS.index(kind))
+        self.amounts.append(amount)
+        self.order_ids.append(order_id)
+
+    def record_many(self, customer_ids, amounts, kind: str) -> None:
+        """Пачка записей одного вида с общим временем"""
+        count = len(customer_ids)
+        self.created_at.extend(array("q", [int(time.time())]) * count)
+        self.customer_ids.extend(customer_ids)
+        self.kinds.extend(array("b", [KINDS.index(kind)]) * count)
+        self.amounts.extend(amounts)
+        self.order_ids.extend(array("q", bytes(8 * count)))
+
+    def rows(self, start: int = 0):
+        """Записи начиная с номера start: (время, ID покупателя, вид, сумма, ID заказа)"""
+        for i in range(start, len(self)):
+            yield (self.created_at[i], self.customer_ids[i], KINDS[self.kinds[i]],
+                   self.amounts[i], self.order_ids[i])
+
+    def entries(self, customer_id: int) -> list[tuple]:
+        """История одного покупателя (проход по всему журналу - для просмотра, не для горячего пути)"""
+        return [row for row in self.rows() if row[1] == customer_id]
+
+    def total(self, customer_id: int) -> float:
+        """Сумма записей покупателя в журнале"""
+        return sum(amount for cid, amount in zip(self.customer_ids, self.amounts) if cid == customer_id)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
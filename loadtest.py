@@ -0,0 +1,319 @@
+import argparse
+import contextlib
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from models import BookStore, OrderStatus
+from file_handlers import FileHandler
+"""Нагрузочный тест: много имитируемых покупателей работают с одним магазином.
+Считает пропускную способность и задержки p50/p95/p99 по операциям,
+в конце проверяет, что деньги и купленные книги сходятся.
+Пример: python loadtest.py --users 50 --duration 10 --mode open --rate 2000"""
+
+# Доли операций по умолчанию
+DEFAULT_MIX = {"browse": 30, "search": 20, "create": 20, "process": 15, "cancel": 5, "topup": 10}
+
+
+def build_store(n_books: int = 1000, n_customers: int = 200, seed: int = 0) -> BookStore:
+    """Синтетический магазин для теста, если файл данных не задан"""
+    rng = random.Random(seed)
+    words = ["война", "мир", "сад", "ночь", "дорога", "море", "город", "сердце", "тайна", "зима"]
+    genres = ["Роман", "Пьеса", "Поэзия", "Детектив", "Фантастика"]
+    store = BookStore()
+    authors = [store.add_author(f"Автор {i}", "Россия") for i in range(max(n_books // 10, 1))]
+    for i in range(n_books):
+        title = f"{rng.choice(words).capitalize()} и {rng.choice(words)} {i}"
+        book = store.add_book(title, rng.choice(authors), round(rng.uniform(100, 1000), 2), rng.choice(genres))
+        book.rating = round(rng.uniform(1, 5), 1)
+    for i in range(n_customers):
+        store.add_customer(f"Покупатель {i}", f"user{i}@mail.ru", round(rng.uniform(0, 5000), 2))
+    store.rebuild_indexes()
+    return store
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу для отсортированного списка"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class InProcessTarget:
+    """Вызовы магазина прямо в потоке покупателя. Магазин не потокобезопасен,
+    поэтому вызовы идут под одной блокировкой, как у однопоточного сервера"""
+    def __init__(self, bookstore: BookStore) -> None:
+        self.bookstore = bookstore
+        self._lock = threading.Lock()
+
+    def call(self, method: str, *args):
+        with self._lock:
+            return getattr(self.bookstore, method)(*args)
+
+    def close(self) -> None:
+        pass
+
+
+class LocalServerTarget:
+    """Замена сервера: магазин обслуживает отдельный поток, запросы идут через очередь.
+    Задержка включает ожидание в очереди, как у настоящего сервера"""
+    def __init__(self, bookstore: BookStore) -> None:
+        self.bookstore = bookstore
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._serve, daemon=True)
+        self._worker.start()
+
+    def _serve(self) -> None:
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            future, method, args = request
+            try:
+                future.set_result(getattr(self.bookstore, method)(*args))
+            except Exception as error:
+                future.set_exception(error)
+
+    def call(self, method: str, *args):
+        future = Future()
+        self._requests.put((future, method, args))
+        return future.result()
+
+    def close(self) -> None:
+        self._requests.put(None)
+        self._worker.join()
+
+
+class LoadTest:
+    """Генератор нагрузки.
+    closed - users покупателей, каждый делает следующую операцию после ответа на предыдущую (+ think_time).
+    open - операции приходят потоком Пуассона с частотой rate в секунду, независимо от ответов;
+    задержка считается от запланированного времени, чтобы очередь не пряталась"""
+    def __init__(self, bookstore: BookStore, target, mix: dict[str, int] | None = None,
+                 seed: int = 0) -> None:
+        self.bookstore = bookstore
+        self.target = target
+        self.mix = mix or DEFAULT_MIX
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._customer_ids = [customer.customer_id for customer in bookstore.customers]
+        self._book_ids = [book.book_id for book in bookstore.books]
+        self._words = sorted({word for book in bookstore.books for word in book.title.lower().split()
+                              if len(word) > 2}) or ["книга"]
+        self._created_orders: list[int] = []
+        self._completed_orders: list[int] = []
+        self.latencies: dict[str, list[float]] = {op: [] for op in self.mix}
+        self.errors: Counter = Counter()
+        self._stats_lock = threading.Lock()
+
+        # Состояние до теста для проверки инвариантов
+        self._initial_balance = sum(customer.balance for customer in bookstore.customers)
+        self._initial_completed = {order.order_id for order in bookstore.orders
+                                   if order.status == OrderStatus.COMPLETED}
+        self._initial_owned = {customer.customer_id: Counter(book.book_id for book in customer.purchased_books)
+                               for customer in bookstore.customers}
+        self.topped_up = 0.0
+
+    # Операции
+    def _pick_op(self, rng: random.Random) -> str:
+        return rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+    def _run_op(self, op: str, rng: random.Random) -> None:
+        if op == "browse":
+            self.target.call("filter_books", None, None, None, None, None, "rating", True, rng.randint(1, 5))
+        elif op == "search":
+            self.target.call("search_books", rng.choice(self._words))
+        elif op == "create":
+            book_ids = rng.sample(self._book_ids, min(rng.randint(1, 3), len(self._book_ids)))
+            order = self.target.call("create_order", rng.choice(self._customer_ids), book_ids)
+            with self._stats_lock:
+                self._created_orders.append(order.order_id)
+        elif op == "process":
+            with self._stats_lock:
+                order_id = self._created_orders.pop(rng.randrange(len(self._created_orders))) \
+                    if self._created_orders else None
+            if order_id is not None and self.target.call("process_order", order_id):
+                with self._stats_lock:
+                    self._completed_orders.append(order_id)
+        elif op == "cancel":
+            with self._stats_lock:
+                pool = self._completed_orders if self._completed_orders and rng.random() < 0.5 \
+                    else self._created_orders
+                order_id = pool.pop(rng.randrange(len(pool))) if pool else None
+            if order_id is not None:
+                self.target.call("cancel_order", order_id)
+        elif op == "topup":
+            amount = round(rng.uniform(100, 1000), 2)
+            self.target.call("add_funds", rng.choice(self._customer_ids), amount)
+            with self._stats_lock:
+                self.topped_up += amount
+
+    def _timed(self, op: str, rng: random.Random, started: float) -> None:
+        try:
+            self._run_op(op, rng)
+        except Exception as error:
+            with self._stats_lock:
+                self.errors[f"{op}: {type(error).__name__}"] += 1
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.latencies[op].append(elapsed)
+
+    def _child_rng(self) -> random.Random:
+        with self._rng_lock:
+            return random.Random(self.rng.random())
+
+    # Модели прихода запросов
+    def run_closed(self, users: int, duration: float, think_time: float = 0.0) -> float:
+        deadline = time.perf_counter() + duration
+
+        def user() -> None:
+            rng = self._child_rng()
+            while time.perf_counter() < deadline:
+                self._timed(self._pick_op(rng), rng, time.perf_counter())
+                if think_time:
+                    time.sleep(rng.expovariate(1 / think_time))
+
+        return self._run_threads([threading.Thread(target=user) for _ in range(users)])
+
+    def run_open(self, rate: float, duration: float, users: int) -> float:
+        """users - сколько потоков разбирают пришедшие запросы"""
+        arrivals = queue.Queue()
+
+        def worker() -> None:
+            rng = self._child_rng()
+            while True:
+                scheduled = arrivals.get()
+                if scheduled is None:
+                    return
+                time.sleep(max(scheduled - time.perf_counter(), 0))
+                self._timed(self._pick_op(rng), rng, scheduled)
+
+        threads = [threading.Thread(target=worker) for _ in range(users)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        scheduled = start
+        while True:
+            scheduled += self.rng.expovariate(rate)
+            if scheduled - start >= duration:
+                break
+            arrivals.put(scheduled)
+        for _ in threads:
+            arrivals.put(None)
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    @staticmethod
+    def _run_threads(threads: list[threading.Thread]) -> float:
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    # Результаты
+    def report(self, elapsed: float) -> list[str]:
+        lines = [f"{'операция':<10}{'кол-во':>9}{'оп/с':>10}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}"]
+        total = 0
+        for op, values in self.latencies.items():
+            values = sorted(values)
+            total += len(values)
+            lines.append(f"{op:<10}{len(values):>9}{len(values) / elapsed:>10.1f}"
+                         f"{percentile(values, 50) * 1000:>10.2f}{percentile(values, 95) * 1000:>10.2f}"
+                         f"{percentile(values, 99) * 1000:>10.2f}")
+        lines.append(f"Всего: {total} операций за {elapsed:.1f} с, {total / elapsed:.1f} оп/с")
+        for error, count in self.errors.most_common():
+            lines.append(f"Ошибка {error}: {count}")
+        return lines
+
+    def check_invariants(self) -> list[str]:
+        """Список нарушений: деньги не появились и не пропали, балансы не ушли в минус,
+        купленные книги совпадают с завершёнными заказами"""
+        store = self.bookstore
+        problems = []
+        completed = {order.order_id: order for order in store.orders if order.status == OrderStatus.COMPLETED}
+        spent = (sum(completed[order_id].total_price for order_id in completed.keys() - self._initial_completed)
+                 - sum(store.find_order(order_id).total_price
+                       for order_id in self._initial_completed - completed.keys()))
+        balance = sum(customer.balance for customer in store.customers)
+        expected = self._initial_balance + self.topped_up - spent
+        if abs(balance - expected) > 1e-6 * max(abs(expected), 1):
+            problems.append(f"Сумма балансов {balance:.2f}, ожидалось {expected:.2f}")
+
+        negative = [customer.customer_id for customer in store.customers if customer.balance < -1e-9]
+        if negative:
+            problems.append(f"Отрицательный баланс у покупателей {negative[:10]}")
+
+        expected_owned = {customer_id: Counter(owned) for customer_id, owned in self._initial_owned.items()}
+        for order_id in completed.keys() - self._initial_completed:
+            order = completed[order_id]
+            expected_owned[order.customer.customer_id].update(order.book_ids)
+        for order_id in self._initial_completed - completed.keys():
+            order = store.find_order(order_id)
+            expected_owned[order.customer.customer_id].subtract(order.book_ids)
+        for customer in store.customers:
+            owned = Counter(book.book_id for book in customer.purchased_books)
+            if +expected_owned.get(customer.customer_id, Counter()) != owned:
+                problems.append(f"Купленные книги покупателя {customer.customer_id} не совпадают с заказами")
+        return problems
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    """"browse=30,search=20,..." -> словарь долей"""
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Неизвестная операция: {op}")
+        mix[op.strip()] = int(weight)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест магазина")
+    parser.add_argument("--data", help="json или xml с данными (файл не изменяется); без него - синтетический магазин")
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--target", choices=("inproc", "server"), default="inproc")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--users", type=int, default=20, help="покупателей (closed) или обработчиков (open)")
+    parser.add_argument("--rate", type=float, default=1000.0, help="запросов в секунду для open")
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза покупателя, с")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность, с")
+    parser.add_argument("--mix", type=parse_mix, default=None, help="доли операций: browse=30,search=20,...")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.data is None:
+        bookstore = build_store(args.books, args.customers, args.seed)
+    elif args.data.endswith(".xml"):
+        bookstore = FileHandler.load_from_xml_file(args.data)
+    else:
+        bookstore = FileHandler.load_from_json_file(args.data)
+    bookstore.get_text_index()
+
+    target = LocalServerTarget(bookstore) if args.target == "server" else InProcessTarget(bookstore)
+    test = LoadTest(bookstore, target, args.mix, args.seed)
+    # Заказы печатают отладочные сообщения - во время теста они не нужны
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if args.mode == "open":
+            elapsed = test.run_open(args.rate, args.duration, args.users)
+        else:
+            elapsed = test.run_closed(args.users, args.duration, args.think_time)
+    target.close()
+
+    print("\n".join(test.report(elapsed)))
+    problems = test.check_invariants()
+    print("Инварианты: " + ("в порядке" if not problems else "НАРУШЕНЫ"))
+    for problem in problems:
+        print(f"  {problem}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,38 @@
+import argparse
 import os
-from models import BookStore, Order
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from models import BookStore, OrderStatus
 from file_handlers import FileHandler
-from exceptions import NotEnoughMoney
+from exceptions import NotEnoughMoney, StaleData, DuplicateEmail
+from pager import Pager, write_lines, PAGE_SIZE
+from analytics import SalesAnalytics
+from coordination import SharedDataDir
+from memory_report import MemoryReport, AllocationTracker
+from script_mode import ScriptRunner
+from replication import ReplicationPublisher
+
+# С какого размера файла данных загружаем его параллельно (меньше - дешевле одним процессом)
+PARALLEL_LOAD_MIN_SIZE = 64 * 1024 * 1024
 
 class DigitalBookStoreApp:
     def __init__(self):
         """Инициализация приложения, указание путей к файлам"""
-        self.BookStore = BookStore()
+        self.bookstore = BookStore()
         self.data_dir = "data" # Папка для хранения файлов данных
         self.json_file = os.path.join(self.data_dir, "books.json")
         self.xml_file = os.path.join(self.data_dir, "books.xml")
+        self.search_index_file = os.path.join(self.data_dir, "search_index.json")
+        self.ledger_file = os.path.join(self.data_dir, "ledger.csv")
+        self.changes_file = os.path.join(self.data_dir, "changes.ndjson")
 
         os.makedirs(self.data_dir, exist_ok=True)
+        # Папку данных могут одновременно использовать несколько процессов
+        self.shared = SharedDataDir(self.data_dir)
+        # Раздача изменений репликам только для чтения (включается start_replication)
+        self.publisher: ReplicationPublisher | None = None
 
         self.load_data()
 
@@ -20,31 +41,175 @@ class DigitalBookStoreApp:
         Сначала проверяет наличие JSON файла, потом XML
         Если файлов нет - создает новый пустой магазин"""
         try:
-            if os.path.exists(self.json_file):
-                # Загружаем из JSON
-                self.bookstore = FileHandler.load_from_json_file(self.json_file)
-                print("Данные загружены из json файла")
-            elif os.path.exists(self.xml_file):
-                # Загружаем из XML файла
-                self.bookstore = FileHandler.load_from_xml_file(self.xml_file)
-                print("Данные заугуженны из xml файла")
-            else:
-                # Файлы не найдены
-                print("Файлы не найдены, создаём новый магазин")
+            with self.shared.lock():
+                self._load_files()
         except Exception as e:
             # Обрабатываем любые ошибки при загрузке
             print(f"Ошибка при загрузке данных: {e}")
             print("Продолжаем с пустым магазином")
-
-    def save_data(self) -> None:
-        """Сохраняет данные в нужные файлы. Вызов при выходе из магазина"""
+        if self.publisher is not None:
+            self.publisher.attach(self.bookstore, self.shared.loaded_version)
+
+    def _load_files(self) -> None:
+        """Загрузка под блокировкой папки данных"""
+        if os.path.exists(self.json_file):
+            # Загружаем из JSON
+            if os.path.getsize(self.json_file) >= PARALLEL_LOAD_MIN_SIZE:
+                self.bookstore = FileHandler.load_parallel(self.json_file)
+            else:
+                self.bookstore = FileHandler.load_from_json_file(self.json_file)
+            # Поисковый индекс берём из файла, если он не устарел
+            self.bookstore.text_index = FileHandler.load_search_index(self.search_index_file,
+                                                                      self.json_file)
+            print("Данные загружены из json файла")
+        elif os.path.exists(self.xml_file):
+            # Загружаем из XML файла
+            if os.path.getsize(self.xml_file) >= PARALLEL_LOAD_MIN_SIZE:
+                self.bookstore = FileHandler.load_parallel(self.xml_file)
+            else:
+                self.bookstore = FileHandler.load_from_xml_file(self.xml_file)
+            print("Данные заугуженны из xml файла")
+        else:
+            # Файлы не найдены
+            print("Файлы не найдены, создаём новый магазин")
+            self.bookstore = BookStore()
+        # Журнал баланса: история прошлых сессий, новые записи допишутся при сохранении
+        self.bookstore.ledger = FileHandler.load_ledger(self.ledger_file)
+        self.shared.attach(self.bookstore)
+        # Изменения за сессию дописываются в поток изменений при сохранении
+        self.bookstore.changes.record = True
+
+    def start_replication(self, socket_path: str) -> None:
+        """Открывает Unix-сокет, через который реплики получают изменения этого процесса"""
+        self.publisher = ReplicationPublisher(self.bookstore, socket_path, self.shared.loaded_version)
+        print(f"Реплики могут подключаться к {socket_path}")
+
+    def save_data(self, merge: bool | None = None) -> bool:
+        """Сохраняет данные в нужные файлы. Вызов при выходе из магазина.
+        merge - объединять ли с чужими изменениями на диске; None - спросить.
+        Возвращает False, если сохранить не удалось (отказ от объединения, конфликт, ошибка записи)"""
         try:
-            FileHandler.save_to_json_file(self.bookstore, self.json_file)
-            FileHandler.save_to_xml_file(self.bookstore, self.xml_file)
-            print("Данные сохранены")
+            with self.shared.lock():
+                merged = False
+                try:
+                    self.shared.check_version()
+                except StaleData as e:
+                    print(e)
+                    if merge is None:
+                        answer = input("Объединить ваши изменения с данными на диске? (y/n): ").strip().lower()
+                        merge = answer == "y"
+                    if not merge:
+                        print("Сохранение отменено")
+                        return False
+                    self.bookstore = self.shared.merge(self.bookstore, self.json_file)
+                    merged = True
+
+                # Пишем из снимка: файлы согласованы между собой, даже если магазин меняется во время записи
+                # Записи и хеши считаются один раз - для обоих файлов и для отпечатков в commit
+                with self.bookstore.snapshot() as snapshot:
+                    prepared = FileHandler.prepare_save(snapshot)
+                    json_written = FileHandler.save_to_json_file(snapshot, self.json_file, prepared)
+                    xml_written = FileHandler.save_to_xml_file(snapshot, self.xml_file, prepared)
+                if json_written or not os.path.exists(self.search_index_file):
+                    FileHandler.save_search_index(self.bookstore.get_text_index(), self.search_index_file,
+                                                  self.json_file)
+                if json_written or xml_written:
+                    self.shared.commit(self.bookstore, fingerprints=prepared[2])
+                FileHandler.append_ledger(self.bookstore.ledger, self.ledger_file)
+                self.bookstore.changes.flush(self.changes_file)
+                if self.publisher is not None and merged:
+                    self.publisher.attach(self.bookstore, self.shared.loaded_version)
+                elif self.publisher is not None:
+                    self.publisher.saved(self.shared.loaded_version)
+            if json_written or xml_written:
+                print("Данные сохранены")
+            else:
+                print("Изменений нет, файлы не перезаписаны")
+            return True
         except Exception as e:
             # Обрабатываем любые ошибки при сохранении
             print(f"Ошибка при сохранении данных: {e}")
+            return False
+
+    def verify_data_files(self) -> None:
+        """Сравнивает json и xml по секциям"""
+        if not (os.path.exists(self.json_file) and os.path.exists(self.xml_file)):
+            print("Для проверки нужны оба файла: json и xml")
+            return
+        try:
+            result = FileHandler.compare_files(self.json_file, self.xml_file)
+        except Exception as e:
+            print(f"Ошибка при проверке файлов: {e}")
+            return
+        print("\nПРОВЕРКА JSON И XML:")
+        for section, same in result.items():
+            print(f"  {section}: {'совпадает' if same else 'РАЗЛИЧАЕТСЯ'}")
+
+    def run_script(self, lines, save: bool = True) -> bool:
+        """Пакетный режим: команды выполняются без меню, в конце одно сохранение и отчёт по времени.
+        Возвращает False, если результат не сохранён"""
+        runner = ScriptRunner(self.bookstore)
+        runner.run(lines)
+        saved = True
+        if save:
+            # Объединяем с чужими изменениями без вопросов: merge откажет, если те же записи
+            # изменил и другой процесс, и тогда сохранение не выполняется
+            saved = self.save_data(merge=True)
+            if not saved:
+                print("Результат скрипта НЕ сохранён: запустите скрипт заново на свежих данных",
+                      file=sys.stderr)
+        write_lines(runner.report())
+        return saved
+
+    def memory_menu(self) -> None:
+        """Сколько памяти занимает магазин и что оставляют загрузка и сохранение (8)"""
+        print("\n1. Память по типам данных")
+        print("2. Замерить загрузку данных")
+        print("3. Замерить сохранение данных")
+        choice = input("Выберите действие: ").strip()
+        if choice == "1":
+            report = MemoryReport(self.bookstore)
+            write_lines(["\nПАМЯТЬ МАГАЗИНА:"] + report.lines())
+            scale = input("Прогноз: книг, покупателей, заказов через пробел (Enter - пропустить): ").split()
+            if len(scale) == 3:
+                try:
+                    books, customers, orders = map(int, scale)
+                except ValueError:
+                    print("Неверный формат чисел")
+                    return
+                projected = report.project({"books": books, "customers": customers, "orders": orders})
+                print(f"Прогноз: {projected / 1024 ** 2:,.1f} МБ")
+        elif choice == "2":
+            if not os.path.exists(self.json_file) and not os.path.exists(self.xml_file):
+                print("Файлы данных не найдены")
+                return
+            # Загружаем во временный магазин: рабочий магазин остаётся как есть
+            try:
+                with AllocationTracker() as tracker:
+                    with self.shared.lock():
+                        if os.path.exists(self.json_file):
+                            loaded = FileHandler.load_from_json_file(self.json_file)
+                        else:
+                            loaded = FileHandler.load_from_xml_file(self.xml_file)
+            except Exception as e:
+                print(f"Ошибка при загрузке данных: {e}")
+                return
+            write_lines([f"Загружено книг: {len(loaded.books)}, заказов: {len(loaded.orders)}"] + tracker.lines())
+        elif choice == "3":
+            # Пишем во временную папку: файлы данных и версия на диске не меняются
+            try:
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    with AllocationTracker() as tracker:
+                        with self.bookstore.snapshot() as snapshot:
+                            prepared = FileHandler.prepare_save(snapshot)
+                            FileHandler.save_to_json_file(snapshot, os.path.join(temp_dir, "books.json"), prepared)
+                            FileHandler.save_to_xml_file(snapshot, os.path.join(temp_dir, "books.xml"), prepared)
+            except Exception as e:
+                print(f"Ошибка при сохранении данных: {e}")
+                return
+            write_lines(tracker.lines())
+        else:
+            print("Неверный выбор")
 
     def display_menu(self) -> None:
         """Главное меню с возможными опциями"""
@@ -57,6 +222,8 @@ class DigitalBookStoreApp:
         print("4. Поиск и просмотр")
         print("5. Сохранить данные")
         print("6. Загрузить данные")
+        print("7. Проверить совпадение JSON и XML")
+        print("8. Отчёт по памяти")
         print("0. Выход")
         print("=" * 50)
 
@@ -71,6 +238,7 @@ class DigitalBookStoreApp:
             print("3. Найти книгу по ID")
             print("4. Найти книгу по названию")
             print("5. Удалить книгу")
+            print("6. Применить скидку")
             print("0. Назад в главное меню")
 
             choice = input("Выберите действие: ").strip()
@@ -85,6 +253,8 @@ class DigitalBookStoreApp:
                 self.find_book_by_title()
             elif choice == "5":
                 self.delete_book()
+            elif choice == "6":
+                self.apply_book_discount()
             elif choice == "0":
                 break
             else:
@@ -171,25 +341,30 @@ class DigitalBookStoreApp:
         if not self.bookstore.books:
             print("В магазине пока нет книг")
             return
-        print(f"\nВСЕ КНИГИ ({len(self.bookstore.books)} шт.):")
-        for book in self.bookstore.books:
-            print(f"  ID: {book.book_id} | '{book.title}' | {book.author.name} "
-                  f"| {book.price} руб. | {book.genre}")
+        pager = Pager(self.bookstore.books, self._format_book_row, item_id=lambda book: book.book_id)
+        pager.browse(f"ВСЕ КНИГИ ({len(self.bookstore.books)} шт.)")
+
+    def _format_book_row(self, book) -> str:
+        return (f"  ID: {book.book_id} | '{book.title}' | {book.author.name} "
+                f"| {self.bookstore.get_price(book)} руб. | {book.genre}")
 
     def find_book_by_id(self) -> None:
-        """Находим книгу по её айди"""
-        title = input("Введите название книги (или часть): ").strip().lower()
-        if not title:
-            print("Введите название для поиска")
-            return
-        # Ищем книги, содержащие введенную подстроку в названии
-        found_books = [book for book in self.bookstore.books if title in book.title.lower()]
-        if not found_books:
-            print("Книги не найдены")
+        """Находим книгу по её айди и показываем страницу книги"""
+        try:
+            book_id = int(input("Введите ID книги: ").strip())
+            book = self.bookstore.find_book(book_id)
+        except ValueError as e:
+            print(f"Ошибка: {e}")
             return
-        print(f"\nНАЙДЕНО КНИГ: {len(found_books)}")
-        for book in found_books:
-            print(f"  ID: {book.book_id} | '{book.title}' | {book.author.name} | {book.price} руб.")
+        print(f"\nID: {book.book_id}")
+        print(self.bookstore.get_book_info(book.book_id))
+
+        # С этой книгой также покупали
+        similar_books = self.bookstore.get_similar_books(book.book_id)
+        if similar_books:
+            print("\nС этой книгой также покупали:")
+            for similar in similar_books:
+                print(f"  - '{similar.title}' - {similar.author.name} ({self.bookstore.get_price(similar)} руб.)")
 
     def delete_book(self) -> None:
         """Удаляет книгу по ID"""
@@ -200,32 +375,22 @@ class DigitalBookStoreApp:
 
             book_id = int(input("\nВведите ID книги для удаления: ").strip())
 
-            # Ищем книгу для удаления
-            book_to_delete = None
-            for book in self.bookstore.books:
-                if book.book_id == book_id:
-                    book_to_delete = book
-                    break
-
-            if not book_to_delete:
+            # Находим книгу по индексу, без прохода по каталогу
+            try:
+                book_to_delete = self.bookstore.find_book(book_id)
+            except ValueError:
                 print("Книга с таким ID не найдена")
                 return
 
             # Проверяем, используется ли книга в заказах
-            used_in_orders = False
-            for order in self.bookstore.orders:
-                if book_to_delete in order.books:
-                    used_in_orders = True
-                    break
-
-            if used_in_orders:
+            if self.bookstore.is_book_ordered(book_to_delete.book_id):
                 print("Нельзя удалить книгу, которая используется в заказах")
                 return
 
             # Подтверждение удаления
             confirm = input(f"Вы уверены, что хотите удалить книгу '{book_to_delete.title}'? (y/n): ")
             if confirm.lower() == 'y':
-                self.bookstore.books.remove(book_to_delete)
+                self.bookstore.delete_book(book_to_delete.book_id)
                 print("Книга удалена")
             else:
                 print("Удаление отменено")
@@ -235,6 +400,19 @@ class DigitalBookStoreApp:
         except Exception as e:
             print(f"Ошибка при удалении: {e}")
 
+    def apply_book_discount(self) -> None:
+        """Применяет скидку к выбранной книге"""
+        try:
+            book_id = int(input("\nВведите ID книги: ").strip())
+            discount = float(input("Скидка в процентах (0-100): ").strip())
+            if not 0 < discount <= 100:
+                print("Скидка должна быть от 0 до 100 процентов")
+                return
+            book = self.bookstore.apply_discount(book_id, discount)
+            print(f"Новая цена книги '{book.title}': {self.bookstore.get_price(book)} руб.")
+        except ValueError as e:
+            print(f"Ошибка ввода: {e}")
+
     def customers_menu(self) -> None:
         """Управление покупателями (2)"""
         while True:
@@ -245,6 +423,10 @@ class DigitalBookStoreApp:
             print("2. Показать всех покупателей")
             print("3. Пополнить баланс")
             print("4. Показать покупки покупателя")
+            print("5. Найти покупателя по почте")
+            print("6. Проверить повторяющиеся почты")
+            print("7. Массовые начисления из файла")
+            print("8. История баланса покупателя")
             print("0. Назад в главное меню")
 
             choice = input("Выберете действие: ").strip()
@@ -257,6 +439,14 @@ class DigitalBookStoreApp:
                 self.add_customer_funds()
             elif choice == "4":
                 self.show_customer_purchases()
+            elif choice == "5":
+                self.find_customer_by_email()
+            elif choice == "6":
+                self.show_duplicate_emails()
+            elif choice == "7":
+                self.apply_credits_file()
+            elif choice == "8":
+                self.show_balance_history()
             elif choice == "0":
                 break
             else:
@@ -276,20 +466,48 @@ class DigitalBookStoreApp:
             customer = self.bookstore.add_customer(name, email, balance)
             print(f"Покупатель '{customer.name}' успешно добавлен! ID: {customer.customer_id}")\
 
+        except DuplicateEmail as e:
+            print(e)
         except ValueError:
             print("Неверный формат баланса")
         except Exception as e:
             print(f"Ошибка: {e}")
 
+    def find_customer_by_email(self) -> None:
+        """Поиск покупателя по почте"""
+        email = input("Введите email: ").strip()
+        try:
+            customer = self.bookstore.find_customer_by_email(email)
+        except ValueError as e:
+            print(e)
+            return
+        print(f"ID: {customer.customer_id} | {customer.get_info()}")
+
+    def show_duplicate_emails(self) -> None:
+        """Почты, которые встречаются у нескольких покупателей (в памяти и в файле данных)"""
+        duplicates = self.bookstore.find_duplicate_emails()
+        if os.path.exists(self.json_file):
+            duplicates.update(FileHandler.find_duplicate_emails(self.json_file))
+        if not duplicates:
+            print("Повторяющихся почт нет")
+            return
+        print("\nПОВТОРЯЮЩИЕСЯ ПОЧТЫ:")
+        for email, customer_ids in sorted(duplicates.items()):
+            print(f"  {email}: покупатели {', '.join(map(str, customer_ids))}")
+
     def show_all_customers(self) -> None:
         """Отображает список всех покупателей магазина"""
         if not self.bookstore.customers:
             print("В магазине пока нет покупателей")
             return
 
-        print(f"\nВСЕ ПОКУПАТЕЛИ ({len(self.bookstore.customers)} шт.):")
-        for customer in self.bookstore.customers:
-            print(f"  ID: {customer.customer_id} | {customer.name} | {customer.email} |"
+        pager = Pager(self.bookstore.customers, self._format_customer_row,
+                      item_id=lambda customer: customer.customer_id)
+        pager.browse(f"ВСЕ ПОКУПАТЕЛИ ({len(self.bookstore.customers)} шт.)")
+
+    @staticmethod
+    def _format_customer_row(customer) -> str:
+        return (f"  ID: {customer.customer_id} | {customer.name} | {customer.email} |"
                 f" Баланс: {customer.balance} руб.")
 
     def add_customer_funds(self) -> None:
@@ -301,25 +519,44 @@ class DigitalBookStoreApp:
 
             customer_id = int(input("\nВведите ID покупателя: ").strip())
             amount = float(input("Сумма пополнения: ").strip())
-
-            # Находим покупателя и пополняем баланс
-            customer = None
-            for cust in self.bookstore.customers:
-                if cust.customer_id == customer_id:
-                    customer = cust
-                    break
-
-            if not customer:
-                print("Покупатель не найден")
-                return
-
-            customer.balance += amount  # Просто увеличиваем баланс
-            print(f"Баланс пополнен. Новый баланс: {customer.balance} руб.")
-
         except ValueError:
             print("Неверный формат данных")
+            return
+        try:
+            customer = self.bookstore.add_funds(customer_id, amount)
+            print(f"Баланс пополнен. Новый баланс: {customer.balance} руб.")
+        except ValueError as e:
+            print(e)
         except Exception as e:
             print(f"{e}")
+    def apply_credits_file(self) -> None:
+        """Начисления из CSV (ID покупателя, сумма) одним проходом: применяются все строки или ни одной"""
+        filename = input("Файл CSV (ID покупателя, сумма): ").strip()
+        kind = input("Вид начисления: 1 - бонусы, 2 - возвраты (по умолчанию 1): ").strip()
+        try:
+            customer_ids, amounts = FileHandler.load_credits(filename)
+            count = self.bookstore.apply_credits(customer_ids, amounts, "refund" if kind == "2" else "promo")
+        except (OSError, ValueError) as e:
+            print(f"Начисления не применены: {e}")
+            return
+        print(f"Применено начислений: {count}, на сумму {sum(amounts):.2f} руб.")
+
+    def show_balance_history(self) -> None:
+        """Записи журнала баланса покупателя, включая прошлые сессии"""
+        try:
+            customer = self.bookstore.find_customer(int(input("Введите ID покупателя: ").strip()))
+        except ValueError as e:
+            print(e)
+            return
+        entries = self.bookstore.ledger.entries(customer.customer_id)
+        if not entries:
+            print("Движений по балансу пока нет")
+            return
+        pager = Pager(entries, lambda entry: (f" {datetime.fromtimestamp(entry[0]):%Y/%m/%d %H:%M} | {entry[2]} "
+                                              f"| {entry[3]:+.2f} руб."
+                                              + (f" | заказ #{entry[4]}" if entry[4] else "")))
+        pager.browse(f"БАЛАНС {customer.name}: {customer.balance} руб.")
+
     def show_customer_purchases(self) -> None:
         try:
             self.show_all_customers()
@@ -329,12 +566,12 @@ class DigitalBookStoreApp:
             customer_id = int(input("\nВведите ID покупателя: ").strip())
             customer = self.bookstore.find_customer(customer_id)
 
-            print(f"\nПОКУПКИ {customer.name}:")
             if not customer.purchased_books:
+                print(f"\nПОКУПКИ {customer.name}:")
                 print("Пока нет покупок")
                 return
-            for i, book in enumerate(customer.purchased_books, 1):
-                print(f"  {i}. '{book.title}' - {book.author.name} ({book.price} руб.)")
+            pager = Pager(self.bookstore.render_customer_purchases(customer_id), lambda line: line)
+            pager.browse(f"ПОКУПКИ {customer.name}")
         except Exception as e:
             print(f"{e}")
     def orders_menu(self) -> None:
@@ -401,10 +638,7 @@ class DigitalBookStoreApp:
                 print("Не найдено книг с указанными ID")
                 return
             # Создание заказа
-            order_id = self.bookstore._next_order_id
-            order = Order(self.bookstore._next_order_id, customer, books)
-            self.bookstore.orders.append(order)
-            self.bookstore._next_order_id += 1
+            order = self.bookstore.create_order(customer.customer_id, [book.book_id for book in books])
 
             print(f"Заказ создан, ID: {order.order_id}")
             print(f"Общая стоимость: {order.total_price} руб.")
@@ -430,31 +664,35 @@ class DigitalBookStoreApp:
 
     def show_all_orders(self) -> None:
         """Отображение списка всех заказов"""
-        if not self.bookstore.customers:
+        if not self.bookstore.orders:
             print("Заказов пока нет")
             return
-        print(f"Все заказы {len(self.bookstore.customers)} шт.")
-        for order in self.bookstore.orders:
-            print(f" ID: {order.order_id} | {order.customer.name} | {order.total_price} руб."
-                  f"| {order.status}")
+        pager = Pager(self.bookstore.orders, self._format_order_row, item_id=lambda order: order.order_id)
+        pager.browse(f"ВСЕ ЗАКАЗЫ ({len(self.bookstore.orders)} шт.)")
+
+    @staticmethod
+    def _format_order_row(order) -> str:
+        return (f" ID: {order.order_id} | {order.customer.name} | {order.total_price} руб."
+                f"| {order.status}")
 
     def process_order(self) -> None:
         """Обрабатывает заказ"""
         try:
-            self.show_all_orders()
-            if not self.bookstore.orders:
+            # Показываем только очередь неоплаченных заказов, а не всю историю
+            pending_count = self.bookstore.count_orders_by_status()[OrderStatus.CREATED]
+            if not pending_count:
+                print("Неоплаченных заказов нет")
                 return
+            pending = self.bookstore.get_pending_orders(PAGE_SIZE)
+            write_lines([f"\nОЖИДАЮТ ОПЛАТЫ ({len(pending)} из {pending_count}):"]
+                        + [self._format_order_row(order) for order in pending])
 
             order_id = int(input("\nВведите ID заказа для обработки: ").strip())
 
-            # Находим заказ
-            order_to_process = None
-            for order in self.bookstore.orders:
-                if order.order_id == order_id:
-                    order_to_process = order
-                    break
-
-            if not order_to_process:
+            # Находим заказ по индексу, без прохода по всей истории
+            try:
+                order_to_process = self.bookstore.find_order(order_id)
+            except ValueError:
                 print("Заказ с таким ID не найден")
                 return
 
@@ -464,7 +702,7 @@ class DigitalBookStoreApp:
             print(f"Сумма заказа: {order_to_process.total_price}")
 
             # Пытаемся обработать заказ
-            if order_to_process.process_order():
+            if self.bookstore.process_order(order_id):
                 print("Заказ успешно обработан!")
                 print(f"Новый баланс покупателя: {order_to_process.customer.balance}")
             else:
@@ -487,19 +725,15 @@ class DigitalBookStoreApp:
                 return
 
             order_id = int(input("\nВведите ID заказа для отмены: ").strip())
-            order = None
-            for ord in self.bookstore.orders:
-                if ord.order_id == order_id:
-                    order = ord
-                    break
-
-            if not order:
+            try:
+                self.bookstore.find_order(order_id)
+            except ValueError:
                 print("Заказ с таким ID не найден")
                 return
 
             confirm = input(f"Вы уверены, что хотите отменить заказ #{order_id}? (y/n): ")
             if confirm.lower() == 'y':
-                if order.cancel_order():
+                if self.bookstore.cancel_order(order_id):
                     print("Заказ отменен")
                 else:
                     print("Не удалось отменить заказ")
@@ -519,6 +753,13 @@ class DigitalBookStoreApp:
             print("1. Показать статистику магазина")
             print("2. Найти книги по автору")
             print("3. Показать все заказы покупателя")
+            print("4. Бестселлеры")
+            print("5. Лучшие по рейтингу")
+            print("6. Рекомендации для покупателя")
+            print("7. Подбор книг по фильтрам")
+            print("8. Поиск по названию, автору и жанру")
+            print("9. Заказы за период")
+            print("10. Отчёты по продажам")
             print("0. Назад в главное меню")
 
             choice = input("Выберите действие: ").strip()
@@ -529,6 +770,20 @@ class DigitalBookStoreApp:
                 self.find_books_by_author()
             elif choice == "3":
                 self.show_customer_orders()
+            elif choice == "4":
+                self.show_bestsellers()
+            elif choice == "5":
+                self.show_top_rated()
+            elif choice == "6":
+                self.show_recommendations()
+            elif choice == "7":
+                self.filter_books()
+            elif choice == "8":
+                self.search_books()
+            elif choice == "9":
+                self.show_orders_between()
+            elif choice == "10":
+                self.show_sales_reports()
             elif choice == "0":
                 break
             else:
@@ -540,12 +795,197 @@ class DigitalBookStoreApp:
         print(f"  Авторов: {len(self.bookstore.authors)}")
         print(f"  Покупателей: {len(self.bookstore.customers)}")
         print(f"  Заказов: {len(self.bookstore.orders)}")
+        for status, count in self.bookstore.count_orders_by_status().items():
+            print(f"    {status}: {count}")
 
         # Выручка по завершённым заказам
         if self.bookstore.orders:
-            total_revenue = sum(order.total_price for order in self.bookstore.orders
-                                if order.status == "completed")
+            total_revenue = sum(order.total_price
+                                for order in self.bookstore.get_orders_by_status(OrderStatus.COMPLETED))
             print(f"  Общая выручка: {total_revenue} руб.")
+            week_ago = int(time.time()) - 7 * 24 * 60 * 60
+            print(f"  Выручка за 7 дней: {self.bookstore.get_revenue_between(week_ago, int(time.time()))} руб.")
+        cache = self.bookstore.view_cache.stats()
+        print(f"  Кэш представлений: {cache['size']}/{cache['maxsize']}, "
+              f"попаданий {cache['hit_ratio']:.0%} ({cache['hits']} из {cache['hits'] + cache['misses']})")
+    def show_bestsellers(self) -> None:
+        """Топ продаж: по всему магазину, по жанру или по автору"""
+        try:
+            n = int(input("Сколько книг показать (по умолчанию 10): ").strip() or "10")
+            print("1. По всему магазину")
+            print("2. По жанру")
+            print("3. По автору")
+            scope = input("Выберите вариант: ").strip()
+
+            if scope == "2":
+                genre = input("Введите жанр: ").strip()
+                books = self.bookstore.get_bestsellers(n, genre=genre)
+                title = f"БЕСТСЕЛЛЕРЫ В ЖАНРЕ '{genre}'"
+            elif scope == "3":
+                author_id = int(input("Введите ID автора: ").strip())
+                books = self.bookstore.get_bestsellers(n, author_id=author_id)
+                title = f"БЕСТСЕЛЛЕРЫ АВТОРА #{author_id}"
+            else:
+                books = self.bookstore.get_bestsellers(n)
+                title = "БЕСТСЕЛЛЕРЫ"
+
+            if not books:
+                print("Продаж пока нет")
+                return
+            print(f"\n{title}:")
+            for i, book in enumerate(books, 1):
+                print(f"  {i}. '{book.title}' - {book.author.name} | "
+                      f"продано: {self.bookstore.sales_counts[book.book_id]}")
+        except ValueError:
+            print("Неверный формат числа")
+
+    def show_top_rated(self) -> None:
+        """Книги с самым высоким рейтингом"""
+        try:
+            n = int(input("Сколько книг показать (по умолчанию 10): ").strip() or "10")
+        except ValueError:
+            print("Неверный формат числа")
+            return
+        books = self.bookstore.get_top_rated(n)
+        if not books:
+            print("В магазине пока нет книг")
+            return
+        print("\nЛУЧШИЕ ПО РЕЙТИНГУ:")
+        for i, book in enumerate(books, 1):
+            print(f"  {i}. '{book.title}' - {book.author.name} | рейтинг: {book.rating}")
+
+    def show_recommendations(self) -> None:
+        """Рекомендации покупателю по истории совместных покупок"""
+        try:
+            self.show_all_customers()
+            if not self.bookstore.customers:
+                return
+
+            customer_id = int(input("\nВведите ID покупателя: ").strip())
+            customer = self.bookstore.find_customer(customer_id)
+            books = self.bookstore.get_recommendations(customer_id)
+
+            if not books:
+                print(f"Для покупателя '{customer.name}' пока нет рекомендаций")
+                return
+            print(f"\nРЕКОМЕНДАЦИИ ДЛЯ '{customer.name}':")
+            for i, book in enumerate(books, 1):
+                print(f"  {i}. '{book.title}' - {book.author.name} ({self.bookstore.get_price(book)} руб.)")
+        except Exception as e:
+            print(f"{e}")
+
+    def filter_books(self) -> None:
+        """Подбор книг по жанру, цене и рейтингу с сортировкой и страницами"""
+        def read_number(prompt: str) -> float | None:
+            value = input(prompt).strip()
+            return float(value) if value else None
+
+        try:
+            print("\nПОДБОР КНИГ (пустой ввод - без ограничения)")
+            genre = input("Жанр: ").strip() or None
+            min_price = read_number("Цена от: ")
+            max_price = read_number("Цена до: ")
+            min_rating = read_number("Рейтинг от: ")
+            print("Сортировка: 1 - по цене, 2 - по рейтингу, 3 - по названию")
+            sort_by = {"2": "rating", "3": "title"}.get(input("Выберите вариант: ").strip(), "price")
+            descending = input("По убыванию? (y/n): ").strip().lower() == 'y'
+            page_size = int(input("Книг на странице (по умолчанию 20): ").strip() or "20")
+        except ValueError:
+            print("Неверный формат числа")
+            return
+
+        page = 1
+        while True:
+            books, total = self.bookstore.filter_books(genre, min_price, max_price, min_rating,
+                                                       sort_by=sort_by, descending=descending,
+                                                       page=page, page_size=page_size)
+            if not total:
+                print("Книги не найдены")
+                return
+            pages = (total + page_size - 1) // page_size
+            print(f"\nНАЙДЕНО КНИГ: {total} (страница {page} из {pages})")
+            for book in books:
+                print(f"  ID: {book.book_id} | '{book.title}' | {book.author.name} "
+                      f"| {self.bookstore.get_price(book)} руб. | {book.genre} | рейтинг: {book.rating}")
+            if page >= pages or input("Следующая страница? (y/n): ").strip().lower() != 'y':
+                return
+            page += 1
+
+    def show_orders_between(self) -> None:
+        """Заказы и выручка за период"""
+        try:
+            start = datetime.strptime(input("Дата начала (ГГГГ/ММ/ДД): ").strip(), "%Y/%m/%d")
+            end_input = input("Дата конца включительно (ГГГГ/ММ/ДД, пусто - сегодня): ").strip()
+            end = datetime.strptime(end_input, "%Y/%m/%d") if end_input else datetime.now()
+        except ValueError:
+            print("Неверный формат даты")
+            return
+        # Конец периода - последняя секунда выбранного дня
+        end = end.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        start_ts, end_ts = int(start.timestamp()), int(end.timestamp()) - 1
+
+        orders = self.bookstore.get_orders_between(start_ts, end_ts)
+        if not orders:
+            print("За этот период заказов нет")
+            return
+        pager = Pager(orders, lambda order: f"{self._format_order_row(order)} | {order.order_date}",
+                      item_id=lambda order: order.order_id)
+        pager.browse(f"ЗАКАЗЫ ЗА ПЕРИОД ({len(orders)} шт.)")
+        print(f"Выручка за период: {self.bookstore.get_revenue_between(start_ts, end_ts)} руб.")
+
+    def show_sales_reports(self) -> None:
+        """Отчёты по продажам с выгрузкой в CSV"""
+        with self.bookstore.snapshot() as snapshot:
+            analytics = SalesAnalytics(snapshot)
+        if not analytics.order_total:
+            print("Завершённых заказов пока нет")
+            return
+
+        reports = {
+            "1": ("Выручка по жанрам", analytics.revenue_by_genre, ("Жанр", "Выручка"), "revenue_by_genre.csv"),
+            "2": ("Выручка по авторам", analytics.revenue_by_author, ("Автор", "Выручка"), "revenue_by_author.csv"),
+            "3": ("Выручка по месяцам", analytics.revenue_by_month, ("Месяц", "Выручка"), "revenue_by_month.csv"),
+            "4": ("Ценность покупателей (LTV)", analytics.customer_lifetime_value,
+                  ("ID", "Покупатель", "Потрачено"), "customer_ltv.csv"),
+        }
+        print("\nОТЧЁТЫ ПО ПРОДАЖАМ")
+        print(f"  Завершённых заказов: {len(analytics.order_total)}")
+        print(f"  Выручка: {analytics.total_revenue()} руб.")
+        print(f"  Средний чек: {analytics.average_order_value():.2f} руб.")
+        for key, (title, *_) in reports.items():
+            print(f"{key}. {title}")
+        choice = input("Выберите отчёт (Enter - назад): ").strip()
+        if choice not in reports:
+            return
+
+        title, build_report, header, csv_name = reports[choice]
+        rows = build_report()
+        pager = Pager(rows, lambda row: "  " + " | ".join(
+            f"{value:.2f}" if isinstance(value, float) else str(value) for value in row))
+        pager.browse(title.upper())
+
+        if input("Сохранить в CSV? (y/n): ").strip().lower() == 'y':
+            filename = os.path.join(self.data_dir, csv_name)
+            analytics.export_csv(rows, header, filename)
+            print(f"Отчёт сохранён в {filename}")
+
+    def search_books(self) -> None:
+        """Полнотекстовый поиск с ранжированием по релевантности"""
+        query = input("Введите запрос: ").strip()
+        if not query:
+            print("Введите запрос для поиска")
+            return
+
+        results = self.bookstore.search_books(query)
+        if not results:
+            print("Книги не найдены")
+            return
+
+        print(f"\nЛУЧШИЕ СОВПАДЕНИЯ ({len(results)}):")
+        for book, score in results:
+            print(f"  ID: {book.book_id} | '{book.title}' | {book.author.name} "
+                  f"| {book.genre} | релевантность: {score:.2f}")
+
     def find_books_by_author(self) -> None:
         """Находит все книги автора"""
         if not self.bookstore.authors:
@@ -556,8 +996,22 @@ class DigitalBookStoreApp:
         for i, author in enumerate(self.bookstore.authors, 1):
             print(f"{i}. '{author.name}' - {author.country}")
         try:
-            choice = int(input("Введите номер автора:").strip()) - 1
-            author = self.bookstore.authors[choice]
+            choice = input("Введите номер или имя автора: ").strip()
+            if choice.isdigit():
+                author = self.bookstore.authors[int(choice) - 1]
+            else:
+                # Ищем по имени с учётом опечаток
+                candidates = self.bookstore.fuzzy_find_authors(choice, k=5)
+                if not candidates:
+                    print("Автор не найден")
+                    return
+                author = candidates[0][0]
+                if len(candidates) > 1:
+                    print("\nПохожие авторы:")
+                    for i, (candidate, _) in enumerate(candidates, 1):
+                        print(f"{i}. '{candidate.name}' - {candidate.country}")
+                    index = input("Введите номер (по умолчанию 1): ").strip() or "1"
+                    author = candidates[int(index) - 1][0]
 
             # Поиск книг данного автора
             author_books = [book for book in self.bookstore.books if book.author.author_id == author.author_id]
@@ -567,7 +1021,7 @@ class DigitalBookStoreApp:
 
             print(f"\nКнига автора {author.name}")
             for book in author_books:
-                print(f"  - '{book.title}' | {book.price} руб. | {book.genre}")
+                print(f"  - '{book.title}' | {self.bookstore.get_price(book)} руб. | {book.genre}")
 
         except (ValueError, IndexError):
             print("Неверный выбор")
@@ -586,12 +1040,19 @@ class DigitalBookStoreApp:
                 found_books.append(book)
 
         if not found_books:
-            print("Книги не найдены")
+            # Точных совпадений нет - пробуем найти с учётом опечаток
+            similar_books = self.bookstore.fuzzy_find_books(title)
+            if not similar_books:
+                print("Книги не найдены")
+                return
+            print("\nТочных совпадений нет. Возможно, вы имели в виду:")
+            for book, _ in similar_books:
+                print(f"  ID: {book.book_id} | '{book.title}' | {book.author.name} | {self.bookstore.get_price(book)} руб.")
             return
 
         print(f"\nНАЙДЕНО КНИГ: {len(found_books)}")
         for book in found_books:
-            print(f"  ID: {book.book_id} | '{book.title}' | {book.author.name} | {book.price} руб.")
+            print(f"  ID: {book.book_id} | '{book.title}' | {book.author.name} | {self.bookstore.get_price(book)} руб.")
 
     def show_customer_orders(self) -> None:
         """Все заказы выбранного покупателя"""
@@ -603,19 +1064,13 @@ class DigitalBookStoreApp:
 
             customer_id = int(input("\nВведите ID покупателя: ").strip())
             customer = self.bookstore.find_customer(customer_id)
-            orders = self.bookstore.get_customer_orders(customer_id)
+            lines = self.bookstore.render_customer_orders(customer_id)
 
-            if not orders:
+            if not lines:
                 print(f"У покупателя '{customer.name}' пока нет заказов")
                 return
 
-            print(f"\nЗАКАЗЫ ПОКУПАТЕЛЯ '{customer.name}':")
-            for order in orders:
-                print(f"\n  Заказ #{order.order_id}:")
-                print(f"    Дата: {order.order_date}")
-                print(f"    Статус: {order.status}")
-                print(f"    Сумма: {order.total_price} руб.")
-                print(f"    Книги: {len(order.books)} шт.")
+            write_lines([f"\nЗАКАЗЫ ПОКУПАТЕЛЯ '{customer.name}':"] + lines)
         except Exception as e:
             print(f"{e}")
 
@@ -641,17 +1096,27 @@ class DigitalBookStoreApp:
                     self.save_data()
                 elif choice == "6":
                     self.load_data()
+                elif choice == "7":
+                    self.verify_data_files()
+                elif choice == "8":
+                    self.memory_menu()
                 elif choice == "0":
-                    self.save_data()  # Сохраняем данные при выходе (0)
-                    print("До свидания! Данные сохранены.")
-                    break
+                    # Сохраняем данные при выходе (0); если не вышло - остаёмся, чтобы изменения не пропали
+                    if self.save_data():
+                        print("До свидания! Данные сохранены.")
+                        break
+                    answer = input("Данные не сохранены. Выйти без сохранения? (y/n): ").strip().lower()
+                    if answer == "y":
+                        print("До свидания! Изменения не сохранены.")
+                        break
                 else:
                     print("Неверный выбор. Попробуйте снова.")
 
             except KeyboardInterrupt:
                 # Обрабатываем прерывание программы (Alt + F4)
                 print("\nПрограмма прервана пользователем")
-                self.save_data()
+                if not self.save_data():
+                    print("Изменения не сохранены")
                 break
             except Exception as e:
                 # Обрабатываем все непредвиденные ошибки
@@ -659,9 +1124,25 @@ class DigitalBookStoreApp:
 
         # Точка входа в программу
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Магазин цифровых книг")
+    parser.add_argument("--script", help="файл с командами для пакетного режима, - для stdin")
+    parser.add_argument("--no-save", action="store_true", help="не сохранять данные после скрипта")
+    parser.add_argument("--replicate", metavar="SOCKET", help="раздавать изменения репликам через Unix-сокет")
+    args = parser.parse_args()
+
     # Создаем экземпляр приложения и запускаем его
     app = DigitalBookStoreApp()
-    app.run()
-
-
-
+    if args.replicate:
+        app.start_replication(args.replicate)
+    saved = True
+    if args.script is None:
+        app.run()
+    elif args.script == "-":
+        saved = app.run_script(sys.stdin, save=not args.no_save)
+    else:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            saved = app.run_script(f, save=not args.no_save)
+    if app.publisher is not None:
+        app.publisher.close()
+    if not saved:
+        sys.exit(1)
@@ -0,0 +1,173 @@
+import gc
+import sys
+import tracemalloc
+from types import FunctionType, ModuleType
+from models import BookStore
+"""Учёт памяти магазина: сколько занимают авторы, книги, покупатели, заказы и индексы,
+прогноз для большего масштаба и замер того, что выделил и оставил вызов (через tracemalloc)"""
+
+# Объекты, которые не относятся к данным магазина и общие для всех
+SKIP_TYPES = (type, ModuleType, FunctionType)
+
+# Подписи сущностей в отчёте
+ENTITY_LABELS = {
+    "authors": "авторы",
+    "books": "книги",
+    "customers": "покупатели",
+    "orders": "заказы",
+    "purchase_lists": "списки покупок",
+}
+
+# По какой сущности масштабируется индекс при прогнозе
+INDEX_DRIVERS = {
+    "индекс каталога": "books",
+    "полнотекстовый индекс": "books",
+    "нечёткий поиск": "books",
+    "рейтинги книг": "books",
+    "книги по ID": "books",
+    "заказы по ID и времени": "orders",
+    "продажи и бестселлеры": "books",
+    "рекомендации": "orders",
+    "цены магазина": "books",
+    "журнал баланса": "orders",
+    "кэш представлений": "customers",
+}
+
+
+def deep_sizeof(obj, seen: set[int]) -> int:
+    """Размер объекта со всем, на что он ссылается, кроме уже посчитанного (seen пополняется)"""
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, SKIP_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        stack.extend(gc.get_referents(current))
+    return size
+
+
+class MemoryReport:
+    """Память магазина по категориям. Общие объекты считаются один раз - в первой категории,
+    поэтому автор книги попадает в авторов, а книга в списке покупок - в книги"""
+    def __init__(self, bookstore: BookStore) -> None:
+        self.bookstore = bookstore
+        # (категория, число сущностей, байт)
+        self.rows: list[tuple[str, int, int]] = []
+        self._measure()
+
+    def _measure(self) -> None:
+        store = self.bookstore
+        catalog = store.catalog
+        seen: set[int] = set()
+        # Списки покупок считаем отдельно от покупателей
+        seen.update(id(customer.purchased_books) for customer in store.customers)
+
+        def entities(name: str, items: list) -> None:
+            size = sys.getsizeof(items)
+            seen.add(id(items))
+            for item in items:
+                size += deep_sizeof(item, seen)
+            self.rows.append((name, len(items), size))
+
+        entities("authors", catalog.authors)
+        entities("books", catalog.books)
+        entities("customers", store.customers)
+        entities("orders", store.orders)
+
+        purchased = 0
+        for customer in store.customers:
+            seen.discard(id(customer.purchased_books))
+            purchased += deep_sizeof(customer.purchased_books, seen)
+        self.rows.append(("purchase_lists", sum(len(c.purchased_books) for c in store.customers), purchased))
+
+        indexes = {
+            "индекс каталога": [catalog.catalog_index],
+            "полнотекстовый индекс": [catalog.text_index],
+            "нечёткий поиск": [catalog._title_fuzzy, catalog._author_fuzzy],
+            "рейтинги книг": [catalog._top_rated],
+            "книги по ID": [catalog._books_by_id, catalog._authors_by_id],
+            "заказы по ID и времени": [store._orders_by_id, store._orders_by_time, store._ordered_books],
+            "продажи и бестселлеры": [store.sales_counts, store._bestsellers,
+                                      store._bestsellers_by_genre, store._bestsellers_by_author],
+            "рекомендации": [store.recommender],
+            "цены магазина": [store.price_overrides, store._override_prices],
+            "журнал баланса": [store.ledger],
+            "кэш представлений": [store.view_cache, store._versions, store._view_refs],
+        }
+        for name, parts in indexes.items():
+            size = sum(deep_sizeof(part, seen) for part in parts if part is not None)
+            self.rows.append((name, 0, size))
+
+    def total(self) -> int:
+        return sum(size for _, _, size in self.rows)
+
+    def counts(self) -> dict[str, int]:
+        return {name: count for name, count, _ in self.rows[:4]}
+
+    def project(self, target: dict[str, int]) -> int:
+        """Прогноз памяти при target = {"books": ..., "customers": ..., "orders": ..., "authors": ...}.
+        Всё масштабируется линейно по числу сущностей, индексы - по своей сущности"""
+        counts = self.counts()
+
+        def scale(entity: str) -> float:
+            return target.get(entity, counts[entity]) / counts[entity] if counts[entity] else 0.0
+
+        projected = 0.0
+        for name, count, size in self.rows:
+            if name in counts:
+                projected += size * scale(name)
+            elif name == "purchase_lists":
+                projected += size * scale("customers")
+            else:
+                projected += size * scale(INDEX_DRIVERS[name])
+        return int(projected)
+
+    def lines(self) -> list[str]:
+        lines = [f"{'категория':<24}{'кол-во':>10}{'байт':>14}{'байт/шт':>10}"]
+        for name, count, size in self.rows:
+            per_item = f"{size / count:>10.0f}" if count else f"{'':>10}"
+            lines.append(f"{ENTITY_LABELS.get(name, name):<24}{count:>10}{size:>14,}{per_item}")
+        lines.append(f"{'всего':<24}{'':>10}{self.total():>14,}")
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"tracemalloc: сейчас {current:,} байт, пик {peak:,} байт")
+        return lines
+
+
+class AllocationTracker:
+    """Что выделил и оставил после себя блок кода:
+    with AllocationTracker() as tracker: FileHandler.load_from_json_file(...); tracker.lines()"""
+    def __init__(self, frames: int = 1) -> None:
+        self.frames = frames
+        self._started = False
+        self.before = None
+        self.after = None
+
+    def __enter__(self) -> "AllocationTracker":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+        gc.collect()
+        self.before = tracemalloc.take_snapshot()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        gc.collect()
+        self.after = tracemalloc.take_snapshot()
+        if self._started:
+            tracemalloc.stop()
+
+    def kept(self) -> int:
+        """Сколько байт осталось занято после блока"""
+        return sum(stat.size_diff for stat in self.after.compare_to(self.before, "filename"))
+
+    def lines(self, limit: int = 10) -> list[str]:
+        stats = self.after.compare_to(self.before, "lineno")
+        lines = [f"Осталось занято после вызова: {self.kept():,} байт"]
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size_diff:>+14,} байт {stat.count_diff:>+9} блоков  "
+                         f"{frame.filename}:{frame.lineno}")
+        return lines
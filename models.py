@@ -1,11 +1,53 @@
-from exceptions import InvalidPrice
+import struct
+import time
+import weakref
+from array import array
+from collections import Counter
+from datetime import datetime
+from enum import StrEnum
+from itertools import islice
+from exceptions import InvalidPrice, CatalogReadOnly, DuplicateEmail
+from rankings import RankIndex
+from recommendations import CoPurchaseRecommender
+from catalog_index import CatalogIndex, SortedIndex
+from text_search import FullTextIndex
+from fuzzy_search import FuzzyIndex
+from snapshots import StoreSnapshot
+from tombstones import TombstoneList
+from ledger import Ledger, KINDS
+from view_cache import LRUCache
+import changes
 """Классы:
 BookStore - магазин
+Catalog - каталог (авторы и книги), может быть общим для нескольких магазинов
 Book - цифровая книга
 Author - автор книги
 Customer - покупатель
 Order - заказ"""
 
+ORDER_DATE_FORMAT = "%Y/%m/%d %H:%M"
+
+def format_order_date(timestamp: int) -> str:
+    """Время заказа (секунды с начала эпохи) в виде строки для вывода"""
+    return datetime.fromtimestamp(timestamp).strftime(ORDER_DATE_FORMAT)
+
+def parse_order_date(order_date: str) -> int:
+    """Строка даты из старых файлов -> секунды с начала эпохи"""
+    return int(datetime.strptime(order_date, ORDER_DATE_FORMAT).timestamp())
+
+def normalize_email(email: str) -> str:
+    """Почта для сравнения: без пробелов по краям и без учёта регистра"""
+    return email.strip().casefold()
+
+def duplicate_emails(customers) -> dict[str, list[int]]:
+    """Один проход по парам (ID покупателя, почта): {почта: [ID]} для почт, встречающихся больше раза"""
+    ids_by_email: dict[str, list[int]] = {}
+    for customer_id, email in customers:
+        key = normalize_email(email)
+        if key:
+            ids_by_email.setdefault(key, []).append(customer_id)
+    return {email: ids for email, ids in ids_by_email.items() if len(ids) > 1}
+
 class Author:
     """Автор книги и его данные"""
     def __init__(self, author_id: int, name: str, country: str = "Неизвестно", birthday: str = "Неизвестно") -> None:
@@ -32,11 +74,11 @@ class Book:
         # Проверка цены
         if self.price <= 0:
             raise InvalidPrice(price)
-    def get_info(self) -> str:
-        """Подробная информация о книге"""
+    def get_info(self, price: float | None = None) -> str:
+        """Подробная информация о книге. price - цена магазина, если она своя"""
         return (f"Книга: {self.title}\n"
                 f"Автор: {self.author}\n"
-                f"Цена: {self.price}\n"
+                f"Цена: {self.price if price is None else price}\n"
                 f"Жанр: {self.genre}\n"
                 f"Рейтинг: {self.rating}")
     def apply_discount(self, discount_persent: float) -> None:
@@ -53,10 +95,10 @@ class Customer:
         self.name = name
         self.email = email
         self.balance = balance
-        self.purchased_books: list[Book] = [] #Купленные книги
+        self.purchased_books: TombstoneList = TombstoneList() #Купленные книги, удаление за O(1)
     def add_money(self, amount: float) -> None:
         """Пополнение боланса"""
-        if amount <= 0:
+        if amount > 0:
             self.balance += amount
     def can_afford(self, amount: float) -> bool:
         """Хватает ли денег"""
@@ -72,28 +114,141 @@ class Customer:
         return f"Покупатель: {self.name}, Почта: {self.email}, Баланс: {self.balance} руб."
     def __str__(self) -> str:
         return f"{self.name}"
+class OrderStatus(StrEnum):
+    """Статус заказа. Значения совпадают со строками в файлах данных"""
+    CREATED = "Created"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+    @classmethod
+    def parse(cls, text: str) -> "OrderStatus":
+        """Статус из файла (регистр в старых файлах мог быть любым)"""
+        for status in cls:
+            if status.value.lower() == text.strip().lower():
+                return status
+        raise ValueError(f"Неизвестный статус заказа: {text}")
+
+
+# Допустимые переходы: созданный заказ можно оплатить или отменить, оплаченный - отменить
+ORDER_TRANSITIONS = {
+    OrderStatus.CREATED: {OrderStatus.COMPLETED, OrderStatus.CANCELLED},
+    OrderStatus.COMPLETED: {OrderStatus.CANCELLED},
+    OrderStatus.CANCELLED: set(),
+}
+
+# Заголовок упакованного заказа: время создания и итоговая сумма
+_ORDER_HEADER = struct.Struct("=qd")
+
+
 class Order:
-    """Класс заказ"""
-    def __init__(self, order_id: int, customer: Customer, books: list[Book]) -> None:
+    """Класс заказ. Хранит не сами книги, а строки заказа.
+    Время создания, сумма, ID книг и цены на момент оформления лежат в одном буфере bytes:
+    [created_at q][total_price d][ID книг q * n][цены d * n] - одна аллокация вместо нескольких объектов"""
+    __slots__ = ("order_id", "customer", "status", "_data")
+
+    def __init__(self, order_id: int, customer: Customer, books: list[Book],
+                 prices: list[float] | None = None) -> None:
+        """prices - цены книг в магазине, если они отличаются от цен каталога"""
         self.order_id = order_id
         self.customer = customer
-        self.books = books.copy()
-        self.status = "Created"
-        self.order_date = self.get_date()
-        self.total_price = self.calculate_total()
-    def get_date(self) -> str:
-        """Текущая дата"""
-        from datetime import datetime
-        return datetime.now().strftime("%Y/%m/%d %H:%M")
+        self.status = OrderStatus.CREATED
+        prices = array("d", prices if prices is not None else (book.price for book in books))
+        self._data = self._pack(int(time.time()), sum(prices), [book.book_id for book in books], prices)
+
+    @staticmethod
+    def _pack(created_at: int, total_price: float, book_ids, prices) -> bytes:
+        return (_ORDER_HEADER.pack(created_at, total_price)
+                + array("q", book_ids).tobytes() + array("d", prices).tobytes())
+
+    @classmethod
+    def from_line_items(cls, order_id: int, customer: Customer, book_ids: list[int], prices: list[float],
+                        created_at: int, status: str, total_price: float | None = None) -> "Order":
+        """Восстанавливает сохранённый заказ по строкам (ID книги, цена)"""
+        if len(book_ids) != len(prices):
+            raise ValueError(f"В заказе #{order_id} число книг и цен не совпадает")
+        order = cls.__new__(cls)
+        order.order_id = order_id
+        order.customer = customer
+        order.status = OrderStatus.parse(status)
+        if total_price is None:
+            total_price = sum(prices)
+        order._data = cls._pack(created_at, total_price, book_ids, prices)
+        return order
+
+    @classmethod
+    def from_packed(cls, order_id: int, customer: Customer, status: "OrderStatus", data: bytes) -> "Order":
+        """Заказ из уже упакованного буфера (см. pack_line_items) - без разбора строк"""
+        order = cls.__new__(cls)
+        order.order_id = order_id
+        order.customer = customer
+        order.status = status
+        order._data = data
+        return order
+
+    @staticmethod
+    def pack_line_items(created_at: int, total_price: float, book_ids, prices) -> bytes:
+        """Буфер заказа; нужен, чтобы упаковать заказы в другом процессе"""
+        if len(book_ids) != len(prices):
+            raise ValueError("Число книг и цен в заказе не совпадает")
+        return Order._pack(created_at, total_price, book_ids, prices)
+
+    @staticmethod
+    def columns(orders: list["Order"]) -> tuple[array, array, array, array]:
+        """Колонки (created_at, total_price, ID книг, цены) сразу для многих заказов.
+        Части буферов склеиваются и разбираются целиком - без распаковки каждого заказа"""
+        buffers = [order._data for order in orders]
+        # Строки заказа из n книг занимают 16 * n байт: ID книг до (len + 16) / 2, дальше цены
+        header = b"".join([data[:_ORDER_HEADER.size] for data in buffers])
+        book_ids = array("q", b"".join([data[_ORDER_HEADER.size:(len(data) + _ORDER_HEADER.size) >> 1]
+                                        for data in buffers]))
+        prices = array("d", b"".join([data[(len(data) + _ORDER_HEADER.size) >> 1:] for data in buffers]))
+        return array("q", header)[0::2], array("d", header)[1::2], book_ids, prices
+
+    @property
+    def created_at(self) -> int:
+        return _ORDER_HEADER.unpack_from(self._data)[0]
+
+    @property
+    def total_price(self) -> float:
+        return _ORDER_HEADER.unpack_from(self._data)[1]
+
+    @property
+    def _count(self) -> int:
+        return (len(self._data) - _ORDER_HEADER.size) // 16
+
+    @property
+    def book_ids(self) -> memoryview:
+        """ID книг в заказе (только для чтения)"""
+        start = _ORDER_HEADER.size
+        return memoryview(self._data)[start:start + 8 * self._count].cast("q")
+
+    @property
+    def prices(self) -> memoryview:
+        """Цены книг на момент заказа (только для чтения)"""
+        return memoryview(self._data)[_ORDER_HEADER.size + 8 * self._count:].cast("d")
+
+    def line_items(self):
+        """Пары (ID книги, цена на момент заказа)"""
+        return zip(self.book_ids, self.prices)
+
+    @property
+    def order_date(self) -> str:
+        """Дата заказа строкой, форматируется только при выводе"""
+        return format_order_date(self.created_at)
+
     def calculate_total(self) -> float:
-        """Общая стоимость"""
-        return sum(book.price for book in self.books)
-    def process_order(self) -> bool:
-        """Обрабатывает заказ - списывает деньги и выдает книги"""
-        if self.status.lower() != "created":
+        """Общая стоимость по ценам на момент заказа"""
+        return sum(self.prices)
+
+    def can_change_status(self, status: OrderStatus) -> bool:
+        return status in ORDER_TRANSITIONS[self.status]
+    def process_order(self, books: list[Book]) -> bool:
+        """Обрабатывает заказ - списывает деньги и выдает книги.
+        books - книги заказа, их выдаёт магазин по book_ids"""
+        if not self.can_change_status(OrderStatus.COMPLETED):
             return False
 
-        total = self.calculate_total()
+        total = self.total_price
 
         # Проверяем достаточно ли денег
         if not self.customer.can_afford(total):
@@ -104,27 +259,32 @@ class Order:
         print(f"DEBUG: Деньги списаны. Новый баланс: {self.customer.balance}")
 
         # Добавляем книги в список покупок
-        self.customer.purchased_books.extend(self.books)
+        self.customer.purchased_books.extend(books)
 
-        self.status = "completed"
+        self.status = OrderStatus.COMPLETED
         print(f"DEBUG: Статус заказа изменен на: {self.status}")
         return True
 
-    def cancel_order(self) -> bool:
-        """Отменяет заказ и возвращает деньги"""
-        if self.status == "completed":
+    def cancel_order(self, books: list[Book]) -> bool:
+        """Отменяет заказ и возвращает деньги. Отменённый заказ повторно не отменяется"""
+        if not self.can_change_status(OrderStatus.CANCELLED):
+            return False
+        if self.status == OrderStatus.COMPLETED:
             # Возвращаем деньги
             self.customer.balance += self.total_price
             # Убираем книги из списка покупок
-            for book in self.books:
+            for book in books:
                 if book in self.customer.purchased_books:
                     self.customer.purchased_books.remove(book)
 
-        self.status = "cancelled"
+        self.status = OrderStatus.CANCELLED
         return True
-    def get_order_info(self) -> str:
-        """Возвращает информацию о заказе"""
-        books_info = "\n".join(f"  - {book.title} ({book.price} руб.)" for book in self.books)
+    def get_order_info(self, books_by_id: dict[int, Book] | None = None) -> str:
+        """Возвращает информацию о заказе. Названия книг берутся из books_by_id"""
+        books_by_id = books_by_id or {}
+        books_info = "\n".join(
+            f"  - {books_by_id[book_id].title if book_id in books_by_id else f'Книга #{book_id}'} ({price} руб.)"
+            for book_id, price in self.line_items())
         return (f"Заказ #{self.order_id}\n"
                 f"Покупатель: {self.customer.name}\n"
                 f"Дата: {self.order_date}\n"
@@ -135,28 +295,415 @@ class Order:
     def __str__(self) -> str:
         return f"Заказ #{self.order_id} - {self.customer.name} - {self.total_price} руб. - {self.status}"
 
-class BookStore:
-    """Основной класс, управляет над другими"""
-    def __init__(self):
-        self.books: list[Book] = []
+class OrderSummary:
+    """Производные данные по части заказов: время создания, очереди статусов, продажи и совместные покупки.
+    Сводки по кускам файла считаются параллельно и складываются через merge"""
+    def __init__(self) -> None:
+        self.created_at: dict[int, int] = {}
+        self.by_status: dict[OrderStatus, list[int]] = {status: [] for status in OrderStatus}
+        self.sales: Counter = Counter()
+        # Сколько раз книга встречается в заказах любого статуса
+        self.ordered: Counter = Counter()
+        self.recommender = CoPurchaseRecommender()
+
+    def add(self, order_id: int, status: "OrderStatus", created_at: int, book_ids) -> None:
+        self.created_at[order_id] = created_at
+        self.by_status[status].append(order_id)
+        self.ordered.update(book_ids)
+        if status == OrderStatus.COMPLETED:
+            self.sales.update(book_ids)
+            self.recommender.add_basket(book_ids)
+
+    def merge(self, other: "OrderSummary") -> None:
+        """Добавляет сводку следующего куска (порядок кусков = порядок заказов в файле)"""
+        self.created_at.update(other.created_at)
+        for status, order_ids in other.by_status.items():
+            self.by_status[status].extend(order_ids)
+        self.sales.update(other.sales)
+        self.ordered.update(other.ordered)
+        self.recommender.merge(other.recommender)
+
+
+class Catalog:
+    """Каталог: авторы, книги и индексы по ним.
+    После freeze() каталог только для чтения, и его можно отдать сразу нескольким магазинам"""
+    def __init__(self) -> None:
+        self.books: TombstoneList = TombstoneList()  # удаление книги за O(1)
         self.authors: list[Author] = []
+        self.frozen = False
+
+        # Счетчики для ID
+        self.next_book_id = 1
+        self.next_author_id = 1
+
+        # Быстрый доступ к книгам и авторам по ID
+        self._books_by_id: dict[int, Book] = {}
+        self._authors_by_id: dict[int, Author] = {}
+
+        # Топ по рейтингу и фасетный индекс для фильтрации
+        self._top_rated = RankIndex()
+        self.catalog_index = CatalogIndex()
+
+        # Полнотекстовый индекс строится при первом поиске или загружается из файла
+        self.text_index: FullTextIndex | None = None
+
+        # Нечёткий поиск по названиям и авторам, тоже строится при первом запросе
+        self._title_fuzzy: FuzzyIndex | None = None
+        self._author_fuzzy: FuzzyIndex | None = None
+
+    def freeze(self) -> None:
+        """Запрещает изменения каталога"""
+        self.frozen = True
+
+    def _check_writable(self) -> None:
+        if self.frozen:
+            raise CatalogReadOnly()
+
+    def add_author(self, name: str, country: str = "Неизвестно") -> Author:
+        """Добавляет нового автора"""
+        self._check_writable()
+        author = Author(self.next_author_id, name, country)
+        self.next_author_id += 1
+        self.authors.append(author)
+        self._index_author(author)
+        return author
+
+    def find_author(self, author_id: int) -> Author:
+        """Находит автора по ID"""
+        author = self._authors_by_id.get(author_id)
+        if author is None:
+            raise ValueError(f"Автор с ID {author_id} не найден")
+        return author
+
+    def add_book(self, title: str, author: Author, price: float,
+                 genre: str = "Не указан") -> Book:
+        """Добавляет новую книгу"""
+        self._check_writable()
+        book = Book(self.next_book_id, title, author, price, genre)
+        self.next_book_id += 1
+        self.books.append(book)
+        self._index_book(book)
+        return book
+
+    def find_book(self, book_id: int) -> Book:
+        """Находит книгу по ID"""
+        book = self._books_by_id.get(book_id)
+        if book is None:
+            raise ValueError(f"Книга с ID {book_id} не найден")
+        return book
+
+    def remove_book(self, book_id: int) -> Book:
+        """Удаляет книгу из каталога и из его индексов"""
+        self._check_writable()
+        book = self.find_book(book_id)
+        self.books.remove(book)
+        self._unindex_book(book)
+        return book
+
+    def apply_discount(self, book_id: int, discount_persent: float) -> Book:
+        """Применяет скидку к книге и обновляет индекс цен"""
+        self._check_writable()
+        book = self.find_book(book_id)
+        book.apply_discount(discount_persent)
+        self.catalog_index.by_price.update(book.book_id, book.price)
+        return book
+
+    # Индексы
+    def _index_book(self, book: Book) -> None:
+        """Добавляет книгу во все индексы каталога"""
+        self._books_by_id[book.book_id] = book
+        self._top_rated.update(book.book_id, book.rating)
+        self.catalog_index.add(book.book_id, book.genre, book.price, book.rating)
+        if self.text_index is not None:
+            self.text_index.add_document(book.book_id, self._book_text(book))
+        if self._title_fuzzy is not None:
+            self._title_fuzzy.add(book.book_id, book.title)
+
+    def _index_author(self, author: Author) -> None:
+        """Добавляет автора в индексы каталога"""
+        self._authors_by_id[author.author_id] = author
+        if self._author_fuzzy is not None:
+            self._author_fuzzy.add(author.author_id, author.name)
+
+    def _unindex_book(self, book: Book) -> None:
+        """Убирает книгу из всех индексов каталога"""
+        self._books_by_id.pop(book.book_id, None)
+        self._top_rated.remove(book.book_id)
+        self.catalog_index.remove(book.book_id, book.genre)
+        if self.text_index is not None:
+            self.text_index.remove_document(book.book_id, self._book_text(book))
+        if self._title_fuzzy is not None:
+            self._title_fuzzy.remove(book.book_id, book.title)
+
+    def rebuild_indexes(self) -> None:
+        """Пересобирает индексы каталога с нуля. Вызывается после загрузки из файла"""
+        self._books_by_id.clear()
+        self._authors_by_id.clear()
+        self._top_rated.clear()
+        self.catalog_index.clear()
+        self.text_index = None
+        self._title_fuzzy = None
+        self._author_fuzzy = None
+        for author in self.authors:
+            self._index_author(author)
+        for book in self.books:
+            self._index_book(book)
+
+    def get_top_rated(self, n: int = 10) -> list[Book]:
+        """Книги с самым высоким рейтингом"""
+        return [self._books_by_id[book_id] for book_id in self._top_rated.top(n)]
+
+    # Полнотекстовый поиск
+    @staticmethod
+    def _book_text(book: Book) -> str:
+        """Текст книги для полнотекстового индекса"""
+        return f"{book.title} {book.author.name} {book.genre}"
+
+    def get_text_index(self) -> FullTextIndex:
+        """Возвращает полнотекстовый индекс, при необходимости строит его"""
+        if self.text_index is None:
+            self.text_index = FullTextIndex()
+            for book in self.books:
+                self.text_index.add_document(book.book_id, self._book_text(book))
+        return self.text_index
+
+    def search_books(self, query: str, k: int = 10) -> list[tuple[Book, float]]:
+        """Поиск по названию, автору и жанру с ранжированием BM25"""
+        return [(self._books_by_id[book_id], score) for book_id, score in self.get_text_index().search(query, k)
+                if book_id in self._books_by_id]
+
+    # Нечёткий поиск
+    def fuzzy_find_books(self, query: str, max_distance: int | None = None,
+                         k: int = 10) -> list[tuple[Book, int]]:
+        """Книги с названием, похожим на запрос (с опечатками): [(книга, расстояние)]"""
+        if self._title_fuzzy is None:
+            self._title_fuzzy = FuzzyIndex()
+            for book in self.books:
+                self._title_fuzzy.add(book.book_id, book.title)
+        return [(self._books_by_id[book_id], distance)
+                for book_id, distance in self._title_fuzzy.search(query, max_distance, k)
+                if book_id in self._books_by_id]
+
+    def fuzzy_find_authors(self, query: str, max_distance: int | None = None,
+                           k: int = 10) -> list[tuple[Author, int]]:
+        """Авторы с именем, похожим на запрос (с опечатками): [(автор, расстояние)]"""
+        if self._author_fuzzy is None:
+            self._author_fuzzy = FuzzyIndex()
+            for author in self.authors:
+                self._author_fuzzy.add(author.author_id, author.name)
+        return [(self._authors_by_id[author_id], distance)
+                for author_id, distance in self._author_fuzzy.search(query, max_distance, k)
+                if author_id in self._authors_by_id]
+
+
+class BookStore:
+    """Основной класс, управляет над другими.
+    Каталог (авторы и книги) может быть общим для нескольких магазинов,
+    покупатели, заказы, балансы и свои цены у каждого магазина отдельные"""
+    def __init__(self, catalog: Catalog | None = None):
+        self.catalog = catalog if catalog is not None else Catalog()
         self.customers: list[Customer] = []
         self.orders: list[Order] = []
 
         # Счетчики для ID
-        self._next_book_id = 1
-        self._next_author_id = 1
         self._next_customer_id = 1
         self._next_order_id = 1
 
+        # Цены этого магазина, отличающиеся от цен каталога (book_id -> цена)
+        self.price_overrides: dict[int, float] = {}
+        self._override_prices = SortedIndex()
+
+        # Покупатели по нормализованной почте (почта уникальна, пустая не индексируется)
+        self._customers_by_email: dict[str, Customer] = {}
+
+        # Быстрый доступ к заказам по ID
+        self._orders_by_id: dict[int, Order] = {}
+
+        # Заказы, отсортированные по времени создания
+        self._orders_by_time = SortedIndex()
+
+        # ID заказов по статусам в порядке перехода в статус (dict как упорядоченное множество)
+        self._orders_by_status: dict[OrderStatus, dict[int, None]] = {status: {} for status in OrderStatus}
+
+        # Сколько раз книга встречается в заказах: книгу из заказа нельзя удалить
+        self._ordered_books: Counter = Counter()
+
+        # Счетчики продаж (book_id -> сколько раз куплена) и индексы для топов
+        self.sales_counts: dict[int, int] = {}
+        self._bestsellers = RankIndex()
+        self._bestsellers_by_genre: dict[str, RankIndex] = {}
+        self._bestsellers_by_author: dict[int, RankIndex] = {}
+
+        # Совместные покупки для рекомендаций
+        self.recommender = CoPurchaseRecommender()
+
+        # Журнал начислений и списаний (балансы покупателей - его закэшированные итоги)
+        self.ledger = Ledger()
+
+        # Версии сущностей (("book", ID) -> номер изменения) и кэш готовых представлений по ним.
+        # ("catalog", 0) - версия состава каталога, ("prices", 0) - версия цен.
+        # Версии хранятся только для сущностей, у которых в кэше есть представления
+        # (_view_refs - сколько их), и удаляются вместе с последним из них
+        self._versions: dict[tuple[str, int], int] = {}
+        self._view_refs: dict[tuple[str, int], int] = {}
+        self.view_cache = LRUCache(on_evict=self._release_view)
+
+        # Поток изменений: события для подписчиков и для файла изменений
+        self.changes = changes.ChangeFeed()
+
+        # Версия данных и открытые снимки для чтения
+        self.version = 0
+        self._snapshots = weakref.WeakSet()
+
+        # Источник блоков ID, когда с одной папкой данных работают несколько процессов.
+        # Объект с методом reserve(kind, floor, count) -> (начало, конец блока)
+        self.id_blocks = None
+        self._id_block_end: dict[str, int] = {}
+
+    # Снимки
+    def snapshot(self) -> StoreSnapshot:
+        """Согласованный снимок для долгого чтения (сохранение, отчёты, списки).
+        Пока снимок открыт, магазин можно менять - снимок этого не увидит"""
+        snapshot = StoreSnapshot(self)
+        self._snapshots.add(snapshot)
+        return snapshot
+
+    def _before_change(self, *entities, books_list: bool = False, price_overrides: bool = False,
+                       catalog: bool = False) -> None:
+        """Вызывается до любого изменения: увеличивает версию магазина и версии затронутых сущностей
+        (кэшированные представления с прошлой версией больше не выдаются) и отдаёт
+        открытым снимкам старые версии объектов, которые сейчас поменяются"""
+        self.version += 1
+        for entity in entities:
+            self._bump_version(self._version_key(entity))
+        if catalog:
+            self._bump_version(("catalog", 0))
+        for snapshot in list(self._snapshots):
+            for entity in entities:
+                snapshot._preserve(entity)
+            if books_list:
+                snapshot._preserve_list("books", self.books)
+            if price_overrides:
+                snapshot._preserve_price_overrides(self.price_overrides)
+
+    @staticmethod
+    def _version_key(entity) -> tuple[str, int]:
+        if isinstance(entity, Order):
+            return "order", entity.order_id
+        if isinstance(entity, Customer):
+            return "customer", entity.customer_id
+        if isinstance(entity, Book):
+            return "book", entity.book_id
+        return "author", entity.author_id
+
+    def _bump_version(self, key: tuple[str, int]) -> None:
+        # У сущности без представлений в кэше устаревать нечему
+        if key in self._versions:
+            self._versions[key] += 1
+
+    def _cached(self, view, key: tuple[str, int], render, depends: tuple = ()):
+        """Представление view сущности key из кэша (view - имя и, если нужно, параметры представления).
+        Ключ кэша включает текущую версию сущности и версии того, от чего представление ещё зависит (depends)"""
+        version_keys = (key, *depends)
+        versions = tuple(self._versions.get(version_key, 0) for version_key in version_keys)
+
+        def render_tracked():
+            value = render()
+            for version_key in version_keys:
+                self._versions.setdefault(version_key, 0)
+                self._view_refs[version_key] = self._view_refs.get(version_key, 0) + 1
+            return value
+        return self.view_cache.get_or_render((view, version_keys, versions), render_tracked)
+
+    def _release_view(self, cache_key: tuple) -> None:
+        """Представление ушло из кэша: версии, на которые больше ничего не ссылается, не нужны"""
+        for version_key in cache_key[1]:
+            refs = self._view_refs[version_key] - 1
+            if refs:
+                self._view_refs[version_key] = refs
+            else:
+                del self._view_refs[version_key]
+                del self._versions[version_key]
+
+    def _reserve_ids(self, kind: str, count: int = 1) -> None:
+        """Следит, чтобы следующие count ID вида kind лежали в блоке, выданном этому процессу"""
+        if self.id_blocks is None:
+            return
+        attribute = f"_next_{kind}_id"
+        next_id = getattr(self, attribute)
+        if next_id + count > self._id_block_end.get(kind, 0):
+            start, end = self.id_blocks.reserve(kind, next_id, count)
+            setattr(self, attribute, start)
+            self._id_block_end[kind] = end
+
+    # Данные каталога
+    @property
+    def books(self) -> TombstoneList:
+        return self.catalog.books
+
+    @property
+    def authors(self) -> list[Author]:
+        return self.catalog.authors
+
+    @property
+    def _next_book_id(self) -> int:
+        return self.catalog.next_book_id
+
+    @_next_book_id.setter
+    def _next_book_id(self, value: int) -> None:
+        self.catalog.next_book_id = value
+
+    @property
+    def _next_author_id(self) -> int:
+        return self.catalog.next_author_id
+
+    @_next_author_id.setter
+    def _next_author_id(self, value: int) -> None:
+        self.catalog.next_author_id = value
+
+    @property
+    def _books_by_id(self) -> dict[int, Book]:
+        return self.catalog._books_by_id
+
+    @property
+    def catalog_index(self) -> CatalogIndex:
+        return self.catalog.catalog_index
+
+    @property
+    def text_index(self) -> FullTextIndex | None:
+        return self.catalog.text_index
+
+    @text_index.setter
+    def text_index(self, value: FullTextIndex | None) -> None:
+        self.catalog.text_index = value
+
     # CRUD операции для Customer
     def add_customer(self, name: str, email: str, balance: float = 0.0) -> Customer:
-        """Добавляет нового покупателя"""
+        """Добавляет нового покупателя. Почта должна быть уникальной"""
+        if normalize_email(email) in self._customers_by_email:
+            raise DuplicateEmail(email)
+        self._before_change()
+        self._reserve_ids("customer")
         customer = Customer(self._next_customer_id, name, email, balance)
         self._next_customer_id += 1
         self.customers.append(customer)
+        self._index_customer(customer)
+        if balance:
+            self.ledger.record(customer.customer_id, balance, "opening")
+        self.changes.emit(changes.CUSTOMER_ADDED, customer.customer_id, name=name, email=email, balance=balance)
         return customer
 
+    def find_customer_by_email(self, email: str) -> Customer:
+        """Находит покупателя по почте без учёта регистра"""
+        customer = self._customers_by_email.get(normalize_email(email))
+        if customer is None:
+            raise ValueError(f"Покупатель с почтой {email} не найден")
+        return customer
+
+    def find_duplicate_emails(self) -> dict[str, list[int]]:
+        """Почты, которые есть у нескольких покупателей: {почта: [ID покупателей]}"""
+        return duplicate_emails((customer.customer_id, customer.email) for customer in self.customers)
+
     def find_customer(self, customer_id: int) -> Customer:
         """Находит покупателя по ID"""
         for customer in self.customers:
@@ -164,6 +711,58 @@ class BookStore:
                 return customer
         raise ValueError(f"Покупатель с ID {customer_id} не найден")
 
+    def add_funds(self, customer_id: int, amount: float) -> Customer:
+        """Пополняет баланс покупателя"""
+        if amount <= 0:
+            raise ValueError("Сумма пополнения должна быть больше нуля")
+        customer = self.find_customer(customer_id)
+        self._before_change(customer)
+        customer.add_money(amount)
+        self.ledger.record(customer_id, amount, "topup")
+        self.changes.emit(changes.BALANCE_CHANGED, customer_id, amount=amount, balance=customer.balance,
+                          reason="topup")
+        return customer
+
+    def apply_credits(self, customer_ids, amounts, kind: str = "promo") -> int:
+        """Массовые начисления (бонусы, возвраты; отрицательная сумма - списание) за один проход.
+        Всё или ничего: если есть неизвестный покупатель или баланс уйдёт в минус,
+        ValueError и ни один баланс не меняется. Возвращает число применённых записей"""
+        # Всё, что может не пройти в журнал, проверяем до изменения балансов
+        if kind not in KINDS:
+            raise ValueError(f"Неизвестный вид начисления: {kind}")
+        if len(customer_ids) != len(amounts):
+            raise ValueError("Число покупателей и сумм не совпадает")
+        try:
+            if not (isinstance(customer_ids, array) and customer_ids.typecode == "q"):
+                customer_ids = array("q", customer_ids)
+            if not (isinstance(amounts, array) and amounts.typecode == "d"):
+                amounts = array("d", amounts)
+        except (TypeError, OverflowError) as error:
+            raise ValueError(f"Неверные данные начислений: {error}")
+        # Сначала суммируем по покупателям, потом один раз меняем каждый баланс
+        totals: dict[int, float] = {}
+        for customer_id, amount in zip(customer_ids, amounts):
+            totals[customer_id] = totals.get(customer_id, 0.0) + amount
+
+        customers = {customer.customer_id: customer for customer in self.customers}
+        unknown = totals.keys() - customers.keys()
+        if unknown:
+            raise ValueError(f"Покупатели не найдены: {', '.join(map(str, sorted(unknown)[:10]))}")
+        overdrawn = [customer_id for customer_id, total in totals.items()
+                     if customers[customer_id].balance + total < 0]
+        if overdrawn:
+            raise ValueError(f"Баланс уйдёт в минус у покупателей: {', '.join(map(str, overdrawn[:10]))}")
+
+        self._before_change(*(customers[customer_id] for customer_id in totals))
+        for customer_id, total in totals.items():
+            customers[customer_id].balance += total
+        self.ledger.record_many(customer_ids, amounts, kind)
+        if self.changes.active:
+            for customer_id, total in totals.items():
+                self.changes.emit(changes.BALANCE_CHANGED, customer_id, amount=total,
+                                  balance=customers[customer_id].balance, reason=kind)
+        return len(amounts)
+
     def get_all_customers(self) -> list[Customer]:
         """Возвращает всех покупателей"""
         return self.customers.copy()
@@ -174,48 +773,413 @@ class BookStore:
             customer = self.find_customer(customer_id)
             books = [self.find_book(book_id) for book_id in book_ids]
 
-            order = Order(self._next_order_id, customer, books)
+            self._before_change(customer)
+            self._reserve_ids("order")
+            order = Order(self._next_order_id, customer, books, [self.get_price(book) for book in books])
             self._next_order_id += 1
             self.orders.append(order)
+            self._index_order(order)
+            self._emit_order_created(order)
 
             return order
         except ValueError as error:
             raise ValueError(f"Ошибка создания заказа: {error}")
 
+    def create_orders(self, batch: list[tuple[int, list[int]]]) -> tuple[list[Order], list[tuple[int, str]]]:
+        """Создает пачку заказов из пар (ID покупателя, ID книг).
+        Проверка всех ID за один проход, один блок номеров заказов и одно время на всю пачку.
+        Ошибочные строки пропускаются: возвращает (заказы, [(номер строки, ошибка)])"""
+        customers = {customer.customer_id: customer for customer in self.customers}
+        books_by_id = self._books_by_id
+
+        valid_rows = []
+        errors = []
+        for row, (customer_id, book_ids) in enumerate(batch):
+            customer = customers.get(customer_id)
+            if customer is None:
+                errors.append((row, f"Покупатель с ID {customer_id} не найден"))
+                continue
+            missing = [book_id for book_id in book_ids if book_id not in books_by_id]
+            if missing:
+                errors.append((row, f"Книги с ID {', '.join(map(str, missing))} не найдены"))
+                continue
+            valid_rows.append((customer, book_ids))
+
+        if not valid_rows:
+            return [], errors
+
+        self._before_change(*{customer.customer_id: customer for customer, _ in valid_rows}.values())
+        self._reserve_ids("order", len(valid_rows))
+        first_id = self._next_order_id
+        self._next_order_id += len(valid_rows)
+        created_at = int(time.time())
+        orders = []
+        for order_id, (customer, book_ids) in enumerate(valid_rows, first_id):
+            prices = [self.get_price(books_by_id[book_id]) for book_id in book_ids]
+            orders.append(Order.from_line_items(order_id, customer, book_ids, prices, created_at,
+                                                OrderStatus.CREATED))
+
+        self.orders.extend(orders)
+        for order in orders:
+            self._index_order(order)
+            self._emit_order_created(order)
+        return orders, errors
+
     def add_author(self, name: str, country: str = "Неизвестно") -> Author:
         """Добавляет нового автора"""
-        author = Author(self._next_author_id, name, country)
-        self._next_author_id += 1
-        self.authors.append(author)
+        self._before_change(catalog=True)
+        if not self.catalog.frozen:
+            self._reserve_ids("author")
+        author = self.catalog.add_author(name, country)
+        self.changes.emit(changes.AUTHOR_ADDED, author.author_id, name=name, country=country)
         return author
 
+    def find_author(self, author_id: int) -> Author:
+        """Находит автора по ID"""
+        return self.catalog.find_author(author_id)
+
     def add_book(self, title: str, author: Author, price: float,
                  genre: str = "Не указан") -> Book:
         """Добавляет новую книгу"""
-        book = Book(self._next_book_id, title, author, price, genre)
-        self._next_book_id += 1
-        self.books.append(book)
+        self._before_change(catalog=True)
+        if not self.catalog.frozen:
+            self._reserve_ids("book")
+        book = self.catalog.add_book(title, author, price, genre)
+        self.changes.emit(changes.BOOK_ADDED, book.book_id, title=title, author_id=author.author_id,
+                          price=price, genre=genre)
         return book
 
     def find_book(self, book_id: int) -> Book:
         """Находит книгу по ID"""
-        for book in self.books:
-            if book.book_id == book_id:
-                return book
-        raise ValueError(f"Книга с ID {book_id} не найден")
+        return self.catalog.find_book(book_id)
+
+    def delete_book(self, book_id: int) -> Book:
+        """Удаляет книгу из магазина и из всех индексов"""
+        self._before_change(self.find_book(book_id), books_list=True, catalog=True)
+        book = self.catalog.remove_book(book_id)
+        self.set_price_override(book_id, None)
+        if book.book_id in self.sales_counts:
+            self._change_sales(book, -self.sales_counts[book.book_id])
+        self.recommender.remove_book(book.book_id)
+        self.changes.emit(changes.BOOK_DELETED, book.book_id)
+        return book
+
+    # Цены
+    def get_price(self, book: Book) -> float:
+        """Цена книги в этом магазине"""
+        return self.price_overrides.get(book.book_id, book.price)
+
+    def set_price_override(self, book_id: int, price: float | None) -> None:
+        """Своя цена магазина на книгу. None - вернуть цену каталога"""
+        self._before_change(price_overrides=True)
+        self._bump_version(("book", book_id))
+        self._bump_version(("prices", 0))
+        if price is None:
+            if self.price_overrides.pop(book_id, None) is not None:
+                self.changes.emit(changes.BOOK_PRICE_CHANGED, book_id, price=None, scope="store")
+            self._override_prices.remove(book_id)
+            return
+        if price <= 0:
+            raise InvalidPrice(price)
+        self.price_overrides[book_id] = price
+        self._override_prices.update(book_id, price)
+        self.changes.emit(changes.BOOK_PRICE_CHANGED, book_id, price=price, scope="store")
+
+    def apply_discount(self, book_id: int, discount_persent: float) -> Book:
+        """Применяет скидку к книге. Общий каталог не меняется - скидка становится ценой магазина"""
+        if not self.catalog.frozen:
+            self._before_change(self.find_book(book_id))
+            self._bump_version(("prices", 0))
+            book = self.catalog.apply_discount(book_id, discount_persent)
+            self.changes.emit(changes.BOOK_PRICE_CHANGED, book_id, price=book.price, scope="catalog",
+                              discount=discount_persent)
+            return book
+        book = self.find_book(book_id)
+        if 0 < discount_persent <= 100:
+            self.set_price_override(book_id, self.get_price(book) * (1 - discount_persent / 100))
+        return book
+
+    def filter_books(self, genre: str | None = None,
+                     min_price: float | None = None, max_price: float | None = None,
+                     min_rating: float | None = None, max_rating: float | None = None,
+                     sort_by: str = "price", descending: bool = False,
+                     page: int = 1, page_size: int = 20) -> tuple[list[Book], int]:
+        """Фасетный поиск по каталогу. Возвращает (книги на странице, всего найдено)"""
+        if sort_by not in ("price", "rating", "title", "book_id"):
+            raise ValueError(f"Нельзя сортировать по полю {sort_by}")
+        if self.price_overrides and (min_price is not None or max_price is not None):
+            # Цены каталога для книг со своей ценой не подходят - берём их из индекса магазина
+            book_ids = self.catalog_index.query(genre, min_rating=min_rating, max_rating=max_rating)
+            price_ids = ((self.catalog_index.by_price.range(min_price, max_price) - self.price_overrides.keys())
+                         | self._override_prices.range(min_price, max_price))
+            book_ids = price_ids if book_ids is None else book_ids & price_ids
+        else:
+            book_ids = self.catalog_index.query(genre, min_price, max_price, min_rating, max_rating)
+        if book_ids is None:
+            books = list(self.books)
+        else:
+            books = [self._books_by_id[book_id] for book_id in book_ids]
+        if sort_by == "price":
+            books.sort(key=lambda book: (self.get_price(book), book.book_id), reverse=descending)
+        else:
+            books.sort(key=lambda book: (getattr(book, sort_by), book.book_id), reverse=descending)
+        start = (max(page, 1) - 1) * page_size
+        return books[start:start + page_size], len(books)
 
     def process_order(self, order_id: int) -> bool:
         """Обрабатывает заказ"""
         order = self.find_order(order_id)
-        return order.process_order()
+        self._before_change(order, order.customer)
+        old_status = order.status
+        if not order.process_order(self.get_order_books(order)):
+            return False
+        self.ledger.record(order.customer.customer_id, -order.total_price, "order", order.order_id)
+        self._move_order(order, old_status)
+        self._on_order_completed(order)
+        self._emit_status_changed(order, old_status)
+        self.changes.emit(changes.BALANCE_CHANGED, order.customer.customer_id, amount=-order.total_price,
+                          balance=order.customer.balance, reason="order")
+        return True
+
+    def cancel_order(self, order_id: int) -> bool:
+        """Отменяет заказ, у завершённого заказа откатывает продажи"""
+        order = self.find_order(order_id)
+        self._before_change(order, order.customer)
+        old_status = order.status
+        if not order.cancel_order(self.get_order_books(order)):
+            return False
+        self._move_order(order, old_status)
+        self._emit_status_changed(order, old_status)
+        if old_status == OrderStatus.COMPLETED:
+            self.ledger.record(order.customer.customer_id, order.total_price, "order_refund", order.order_id)
+            self._on_order_reverted(order)
+            self.changes.emit(changes.BALANCE_CHANGED, order.customer.customer_id, amount=order.total_price,
+                              balance=order.customer.balance, reason="order_refund")
+        return True
 
     def find_order(self, order_id: int) -> Order:
         """Находит заказ по ID"""
-        for order in self.orders:
-            if order.order_id == order_id:
-                return order
-        raise ValueError(f"Заказ с ID {order_id} не найден")
+        order = self._orders_by_id.get(order_id)
+        if order is None:
+            raise ValueError(f"Заказ с ID {order_id} не найден")
+        return order
+
+    def get_orders_between(self, start: int, end: int) -> list[Order]:
+        """Заказы, созданные в отрезке [start, end] (секунды с начала эпохи), по времени"""
+        return [self._orders_by_id[order_id] for order_id in self._orders_by_time.range_ids(start, end)]
+
+    def get_revenue_between(self, start: int, end: int) -> float:
+        """Выручка по завершённым заказам за период"""
+        return sum(order.total_price for order in self.get_orders_between(start, end)
+                   if order.status == OrderStatus.COMPLETED)
+
+    def get_orders_by_status(self, status: OrderStatus, n: int | None = None) -> list[Order]:
+        """Первые n заказов в статусе (все, если n не задано) в порядке перехода в статус"""
+        return [self._orders_by_id[order_id] for order_id in islice(self._orders_by_status[status], n)]
+
+    def get_pending_orders(self, n: int | None = None) -> list[Order]:
+        """Очередь неоплаченных заказов, самые старые первыми"""
+        return self.get_orders_by_status(OrderStatus.CREATED, n)
+
+    def count_orders_by_status(self) -> dict[OrderStatus, int]:
+        return {status: len(order_ids) for status, order_ids in self._orders_by_status.items()}
+
+    def get_order_books(self, order: Order) -> list[Book]:
+        """Книги заказа (удалённые из каталога пропускаются)"""
+        return [self._books_by_id[book_id] for book_id in order.book_ids if book_id in self._books_by_id]
+
+    def get_order_info(self, order_id: int) -> str:
+        """Информация о заказе с названиями книг"""
+        order = self.find_order(order_id)
+        return self._cached("order_info", ("order", order_id), lambda: order.get_order_info(self._books_by_id),
+                            depends=(("catalog", 0),))
+
+    def get_book_info(self, book_id: int) -> str:
+        """Страница книги с ценой магазина"""
+        book = self.find_book(book_id)
+        return self._cached("book_info", ("book", book_id), lambda: book.get_info(self.get_price(book)))
+
+    def is_book_ordered(self, book_id: int) -> bool:
+        """Есть ли книга хотя бы в одном заказе"""
+        return self._ordered_books[book_id] > 0
 
     def get_customer_orders(self, customer_id: int) -> list[Order]:
-        """Возвращает все заказы покупателя"""
-        return [order for order in self.orders if order.customer.customer_id == customer_id]
+        """Возвращает все заказы покупателя. Новые заказы меняют версию покупателя,
+        поэтому список берётся из кэша, а полный просмотр заказов - только при промахе"""
+        order_ids = self._cached("order_ids", ("customer", customer_id),
+                                 lambda: [order.order_id for order in self.orders
+                                          if order.customer.customer_id == customer_id])
+        return [self._orders_by_id[order_id] for order_id in order_ids]
+
+    def render_customer_orders(self, customer_id: int) -> list[str]:
+        """Строки со всеми заказами покупателя для вывода"""
+        def render() -> list[str]:
+            lines = []
+            for order in self.get_customer_orders(customer_id):
+                lines.append(f"\n  Заказ #{order.order_id}:")
+                lines.append(f"    Дата: {order.order_date}")
+                lines.append(f"    Статус: {order.status}")
+                lines.append(f"    Сумма: {order.total_price} руб.")
+                lines.append(f"    Книги: {len(order.book_ids)} шт.")
+            return lines
+
+        return self._cached("orders_view", ("customer", customer_id), render)
+
+    def render_customer_purchases(self, customer_id: int) -> list[str]:
+        """Строки с купленными книгами покупателя для вывода"""
+        customer = self.find_customer(customer_id)
+        return self._cached("purchases_view", ("customer", customer_id),
+                            lambda: [f"  ID: {book.book_id} | '{book.title}' - {book.author.name} ({self.get_price(book)} руб.)"
+                                     for book in customer.purchased_books],
+                            depends=(("prices", 0),))
+
+    # Индексы
+    def rebuild_indexes(self, summary: OrderSummary | None = None) -> None:
+        """Пересобирает индексы с нуля. Вызывается после загрузки из файла.
+        Общий (замороженный) каталог не трогаем - его индексы уже построены.
+        summary - сводка по всем заказам, если она уже посчитана (параллельная загрузка)"""
+        if not self.catalog.frozen:
+            self.catalog.rebuild_indexes()
+        self._override_prices.clear()
+        for book_id, price in self.price_overrides.items():
+            self._override_prices.update(book_id, price)
+        self._customers_by_email.clear()
+        for customer in self.customers:
+            self._index_customer(customer)
+
+        if summary is None:
+            summary = OrderSummary()
+            for order in self.orders:
+                summary.add(order.order_id, order.status, order.created_at, order.book_ids)
+        # Индексы заполняются целиком (одна сортировка), а не вставкой по заказу
+        self._orders_by_id.clear()
+        self._orders_by_id.update((order.order_id, order) for order in self.orders)
+        self._orders_by_time.build(summary.created_at)
+        for status, order_ids in summary.by_status.items():
+            self._orders_by_status[status] = dict.fromkeys(order_ids)
+        self.recommender = summary.recommender
+        self._ordered_books = summary.ordered
+        # Продажи удалённых книг не считаются - как в get_order_books
+        self._build_sales({book_id: count for book_id, count in summary.sales.items()
+                           if book_id in self._books_by_id})
+
+    def _build_sales(self, sales_counts: dict[int, int]) -> None:
+        """Счётчики продаж и топы по ним с нуля"""
+        self.sales_counts = sales_counts
+        self._bestsellers.build(sales_counts)
+        by_genre: dict[str, dict[int, int]] = {}
+        by_author: dict[int, dict[int, int]] = {}
+        for book_id, count in sales_counts.items():
+            book = self._books_by_id[book_id]
+            by_genre.setdefault(book.genre, {})[book_id] = count
+            by_author.setdefault(book.author.author_id, {})[book_id] = count
+        self._bestsellers_by_genre = {genre: RankIndex() for genre in by_genre}
+        for genre, counts in by_genre.items():
+            self._bestsellers_by_genre[genre].build(counts)
+        self._bestsellers_by_author = {author_id: RankIndex() for author_id in by_author}
+        for author_id, counts in by_author.items():
+            self._bestsellers_by_author[author_id].build(counts)
+
+    def _index_customer(self, customer: Customer) -> None:
+        """Добавляет покупателя в индекс почты. В старых файлах почта могла повторяться -
+        тогда в индексе остаётся первый покупатель, остальных покажет find_duplicate_emails"""
+        key = normalize_email(customer.email)
+        if key:
+            self._customers_by_email.setdefault(key, customer)
+
+    def _index_order(self, order: Order) -> None:
+        """Добавляет заказ в индексы магазина"""
+        self._orders_by_id[order.order_id] = order
+        self._orders_by_time.update(order.order_id, order.created_at)
+        self._orders_by_status[order.status][order.order_id] = None
+        self._ordered_books.update(order.book_ids)
+
+    def _move_order(self, order: Order, old_status: OrderStatus) -> None:
+        """Переносит заказ в очередь нового статуса"""
+        del self._orders_by_status[old_status][order.order_id]
+        self._orders_by_status[order.status][order.order_id] = None
+
+    def _emit_order_created(self, order: Order) -> None:
+        self.changes.emit(changes.ORDER_CREATED, order.order_id, customer_id=order.customer.customer_id,
+                          book_ids=list(order.book_ids), prices=list(order.prices),
+                          total_price=order.total_price, created_at=order.created_at)
+
+    def _emit_status_changed(self, order: Order, old_status: OrderStatus) -> None:
+        self.changes.emit(changes.ORDER_STATUS_CHANGED, order.order_id, old_status=str(old_status),
+                          status=str(order.status))
+
+    def _on_order_completed(self, order: Order) -> None:
+        """Обновляет производные данные после оплаты заказа"""
+        for book in self.get_order_books(order):
+            self._change_sales(book, 1)
+        self.recommender.add_basket(order.book_ids)
+
+    def _on_order_reverted(self, order: Order) -> None:
+        """Откатывает производные данные при отмене оплаченного заказа"""
+        for book in self.get_order_books(order):
+            self._change_sales(book, -1)
+        self.recommender.remove_basket(order.book_ids)
+
+    def _change_sales(self, book: Book, delta: int) -> None:
+        """Меняет счетчик продаж книги и обновляет топы"""
+        count = self.sales_counts.get(book.book_id, 0) + delta
+        indexes = (self._bestsellers,
+                   self._bestsellers_by_genre.setdefault(book.genre, RankIndex()),
+                   self._bestsellers_by_author.setdefault(book.author.author_id, RankIndex()))
+        if count > 0:
+            self.sales_counts[book.book_id] = count
+            for index in indexes:
+                index.update(book.book_id, count)
+        else:
+            self.sales_counts.pop(book.book_id, None)
+            for index in indexes:
+                index.remove(book.book_id)
+
+    # Топы
+    def get_bestsellers(self, n: int = 10, genre: str | None = None,
+                        author_id: int | None = None) -> list[Book]:
+        """Самые продаваемые книги: все, по жанру или по автору"""
+        if genre is not None:
+            index = self._bestsellers_by_genre.get(genre, RankIndex())
+        elif author_id is not None:
+            index = self._bestsellers_by_author.get(author_id, RankIndex())
+        else:
+            index = self._bestsellers
+        return [self._books_by_id[book_id] for book_id in index.top(n)
+                if book_id in self._books_by_id]
+
+    def get_top_rated(self, n: int = 10) -> list[Book]:
+        """Книги с самым высоким рейтингом"""
+        return self.catalog.get_top_rated(n)
+
+    # Рекомендации
+    def get_similar_books(self, book_id: int, k: int = 5) -> list[Book]:
+        """С этой книгой также покупали"""
+        return [self._books_by_id[other_id] for other_id, _ in self.recommender.similar_books(book_id, k)
+                if other_id in self._books_by_id]
+
+    def get_recommendations(self, customer_id: int, k: int = 5) -> list[Book]:
+        """Рекомендации покупателю, без уже купленных книг"""
+        customer = self.find_customer(customer_id)
+        owned_ids = [book.book_id for book in customer.purchased_books]
+        return [self._books_by_id[book_id] for book_id, _ in self.recommender.recommend(owned_ids, k)
+                if book_id in self._books_by_id]
+
+    # Поиск по каталогу
+    def get_text_index(self) -> FullTextIndex:
+        """Возвращает полнотекстовый индекс, при необходимости строит его"""
+        return self.catalog.get_text_index()
+
+    def search_books(self, query: str, k: int = 10) -> list[tuple[Book, float]]:
+        """Поиск по названию, автору и жанру с ранжированием BM25. Результаты кэшируются до изменения каталога"""
+        return self._cached(("search", query, k), ("catalog", 0), lambda: self.catalog.search_books(query, k))
+
+    def fuzzy_find_books(self, query: str, max_distance: int | None = None,
+                         k: int = 10) -> list[tuple[Book, int]]:
+        """Книги с названием, похожим на запрос (с опечатками): [(книга, расстояние)]"""
+        return self.catalog.fuzzy_find_books(query, max_distance, k)
+
+    def fuzzy_find_authors(self, query: str, max_distance: int | None = None,
+                           k: int = 10) -> list[tuple[Author, int]]:
+        """Авторы с именем, похожим на запрос (с опечатками): [(автор, расстояние)]"""
+        return self.catalog.fuzzy_find_authors(query, max_distance, k)
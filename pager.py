@@ -0,0 +1,72 @@
+import sys
+from bisect import bisect_left
+"""Постраничный вывод больших списков"""
+
+PAGE_SIZE = 20
+
+
+def write_lines(lines: list[str]) -> None:
+    """Выводит пачку строк одной буферизованной записью вместо print на каждую строку"""
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+
+class Pager:
+    """Курсор по списку с постраничным выводом.
+    Строки форматируются только для текущей страницы, остальной список не трогаем"""
+    def __init__(self, items: list, format_row, page_size: int = PAGE_SIZE, item_id=None) -> None:
+        self.items = items
+        self.format_row = format_row
+        self.page_size = max(page_size, 1)
+        self.item_id = item_id  # функция item -> ID, нужна для перехода к записи
+        self.cursor = 0
+
+    def page(self) -> list[str]:
+        """Отформатированные строки текущей страницы"""
+        return [self.format_row(item) for item in self.items[self.cursor:self.cursor + self.page_size]]
+
+    def pages(self):
+        """Генератор страниц от курсора до конца списка"""
+        while self.cursor < len(self.items):
+            yield self.page()
+            self.cursor += self.page_size
+
+    def jump_to_id(self, item_id: int) -> bool:
+        """Ставит курсор на страницу с записью item_id.
+        Списки магазина упорядочены по ID, поэтому сначала пробуем бинарный поиск"""
+        if self.item_id is None:
+            return False
+        position = bisect_left(self.items, item_id, key=self.item_id)
+        if position >= len(self.items) or self.item_id(self.items[position]) != item_id:
+            position = next((i for i, item in enumerate(self.items) if self.item_id(item) == item_id), None)
+            if position is None:
+                return False
+        self.cursor = position - position % self.page_size
+        return True
+
+    def browse(self, title: str) -> None:
+        """Интерактивный просмотр: Enter - дальше, b - назад, g ID - к записи, q - выход"""
+        total = len(self.items)
+        while True:
+            end = min(self.cursor + self.page_size, total)
+            write_lines([f"\n{title} ({self.cursor + 1}-{end} из {total}):"] + self.page())
+            if total <= self.page_size:
+                return
+
+            hint = "g ID - к записи, " if self.item_id is not None else ""
+            command = input(f"Enter - дальше, b - назад, {hint}q - выход: ").strip().lower()
+            if command == "q":
+                return
+            elif command == "b":
+                self.cursor = max(self.cursor - self.page_size, 0)
+            elif command.startswith("g") and self.item_id is not None:
+                try:
+                    if not self.jump_to_id(int(command[1:].strip())):
+                        print("Запись с таким ID не найдена")
+                except ValueError:
+                    print("Неверный формат ID")
+            elif end >= total:
+                return
+            else:
+                self.cursor = end
@@ -0,0 +1,45 @@
+from bisect import bisect_left, insort
+"""Индексы для топов (бестселлеры, рейтинг)"""
+
+class RankIndex:
+    """Отсортированный по убыванию оценки список ID.
+    Хранит пары (-оценка, id), поэтому топ-N это просто срез без обхода всех записей"""
+    def __init__(self) -> None:
+        self._scores: dict[int, float] = {}
+        self._keys: list[tuple[float, int]] = []
+
+    def update(self, item_id: int, score: float) -> None:
+        """Добавляет запись или меняет её оценку"""
+        self.remove(item_id)
+        self._scores[item_id] = score
+        insort(self._keys, (-score, item_id))
+
+    def remove(self, item_id: int) -> None:
+        """Убирает запись из индекса (если она там есть)"""
+        score = self._scores.pop(item_id, None)
+        if score is None:
+            return
+        index = bisect_left(self._keys, (-score, item_id))
+        del self._keys[index]
+
+    def build(self, scores: dict[int, float]) -> None:
+        """Заполняет индекс заново одной сортировкой вместо вставки по одной записи"""
+        self._scores = dict(scores)
+        self._keys = sorted((-score, item_id) for item_id, score in self._scores.items())
+
+    def top(self, n: int) -> list[int]:
+        """ID первых n записей по убыванию оценки"""
+        return [item_id for _, item_id in self._keys[:max(n, 0)]]
+
+    def score(self, item_id: int) -> float:
+        return self._scores.get(item_id, 0)
+
+    def clear(self) -> None:
+        self._scores.clear()
+        self._keys.clear()
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._scores
+
+    def __len__(self) -> int:
+        return len(self._keys)
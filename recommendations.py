@@ -0,0 +1,76 @@
+import heapq
+from collections import Counter
+"""Рекомендации "с этой книгой также покупали" """
+
+class CoPurchaseRecommender:
+    """Разреженная матрица совместных покупок книга x книга.
+    Храним только ненулевые ячейки: book_id -> Counter(другая книга -> сколько раз куплены вместе)"""
+    def __init__(self) -> None:
+        self._matrix: dict[int, Counter] = {}
+
+    def add_basket(self, book_ids: list[int]) -> None:
+        """Учитывает один завершённый заказ"""
+        self._update(book_ids, 1)
+
+    def remove_basket(self, book_ids: list[int]) -> None:
+        """Откатывает заказ (например, при отмене)"""
+        self._update(book_ids, -1)
+
+    def _update(self, book_ids: list[int], delta: int) -> None:
+        unique_ids = set(book_ids)
+        for book_id in unique_ids:
+            row = self._matrix.setdefault(book_id, Counter())
+            for other_id in unique_ids:
+                if other_id == book_id:
+                    continue
+                row[other_id] += delta
+                if row[other_id] <= 0:
+                    del row[other_id]
+            if not row:
+                del self._matrix[book_id]
+
+    def build(self, baskets) -> None:
+        """Строит матрицу заново по списку корзин (списков book_id)"""
+        self._matrix.clear()
+        for book_ids in baskets:
+            self.add_basket(book_ids)
+
+    def merge(self, other: "CoPurchaseRecommender") -> None:
+        """Добавляет матрицу, посчитанную по другой части заказов (параллельная загрузка)"""
+        for book_id, other_row in other._matrix.items():
+            row = self._matrix.get(book_id)
+            if row is None:
+                self._matrix[book_id] = other_row
+            else:
+                row.update(other_row)
+
+    def remove_book(self, book_id: int) -> None:
+        """Убирает книгу из матрицы целиком"""
+        row = self._matrix.pop(book_id, None)
+        if not row:
+            return
+        for other_id in row:
+            other_row = self._matrix.get(other_id)
+            if other_row is not None:
+                other_row.pop(book_id, None)
+                if not other_row:
+                    del self._matrix[other_id]
+
+    def similar_books(self, book_id: int, k: int = 5) -> list[tuple[int, int]]:
+        """Топ-k книг, которые чаще всего покупали вместе с данной: [(book_id, раз)]"""
+        row = self._matrix.get(book_id)
+        if not row:
+            return []
+        return heapq.nlargest(k, row.items(), key=lambda item: (item[1], -item[0]))
+
+    def recommend(self, owned_ids, k: int = 5) -> list[tuple[int, int]]:
+        """Топ-k книг для покупателя по его покупкам, без уже купленных"""
+        owned = set(owned_ids)
+        scores = Counter()
+        for book_id in owned:
+            row = self._matrix.get(book_id)
+            if row:
+                scores.update(row)
+        for book_id in owned:
+            scores.pop(book_id, None)
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
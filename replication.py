@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from coordination import SharedDataDir
+from file_handlers import FileHandler
+from models import BookStore, Order, OrderStatus
+from script_mode import ScriptRunner
+import changes
+"""Реплики только для чтения.
+Основной процесс (писатель) раздаёт события своего потока изменений через Unix-сокет (ReplicationPublisher).
+Реплика (Follower) загружает последний сохранённый снимок данных, подключается к сокету и применяет
+события к своей копии магазина. Поиск, списки и отчёты можно обслуживать несколькими процессами-репликами,
+не нагружая писателя. Реплика запускается так:
+    python replication.py data/replication.sock --data data < запросы.txt"""
+
+# Как часто писатель сообщает репликам свою позицию, когда событий нет (секунды)
+HEARTBEAT_INTERVAL = 1.0
+
+
+class ReplicationPublisher:
+    """Сторона писателя. Подписывается на bookstore.changes и рассылает события подключённым репликам.
+    Каждой реплике - своя очередь и поток отправки, поэтому медленная реплика не тормозит изменения.
+    События с последнего сохранения держатся в памяти: новая реплика грузит снимок с диска
+    и получает их сразу после приветствия"""
+    def __init__(self, bookstore: BookStore, socket_path: str, version: int = 0) -> None:
+        self.socket_path = socket_path
+        self.version = version
+        self.seq = 0
+        # Номер последнего события до сохранения и события после него: [(номер, строка)]
+        self._base = 0
+        self._backlog: list[tuple[int, bytes]] = []
+        self._followers: list[queue.Queue] = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(socket_path)
+        self._server.listen()
+        self._unsubscribe = bookstore.changes.subscribe(self._publish)
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+
+    @staticmethod
+    def _line(message: dict) -> bytes:
+        return (json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8')
+
+    def _broadcast(self, line: bytes) -> None:
+        for follower in self._followers:
+            follower.put(line)
+
+    def _publish(self, event: changes.ChangeEvent) -> None:
+        with self._lock:
+            self.seq += 1
+            line = self._line({"type": "event", "seq": self.seq, "event": event.to_dict()})
+            self._backlog.append((self.seq, line))
+            self._broadcast(line)
+
+    def saved(self, version: int, resync: bool = False) -> None:
+        """Вызывается после сохранения: снимок на диске теперь содержит все события.
+        resync - в магазин попали чужие изменения (объединение), и реплики должны перечитать снимок"""
+        with self._lock:
+            self.version = version
+            self._base = self.seq
+            self._backlog.clear()
+            if resync:
+                self._broadcast(self._line({"type": "resync", "version": version}))
+
+    def attach(self, bookstore: BookStore, version: int) -> None:
+        """Писатель заменил магазин (перезагрузка, объединение): подписываемся на поток изменений нового
+        магазина и просим реплики перечитать снимок - события старого магазина к нему не относятся"""
+        self._unsubscribe()
+        self._unsubscribe = bookstore.changes.subscribe(self._publish)
+        self.saved(version, resync=True)
+
+    def _accept(self) -> None:
+        while not self._closed.is_set():
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            outbox = queue.Queue()
+            with self._lock:
+                outbox.put(self._line({"type": "hello", "version": self.version, "base": self._base}))
+                for _, line in self._backlog:
+                    outbox.put(line)
+                self._followers.append(outbox)
+            threading.Thread(target=self._send, args=(connection, outbox), daemon=True).start()
+
+    def _send(self, connection: socket.socket, outbox: queue.Queue) -> None:
+        with connection:
+            while True:
+                line = outbox.get()
+                if line is None:
+                    break
+                try:
+                    connection.sendall(line)
+                except OSError:
+                    break
+        with self._lock:
+            self._followers.remove(outbox)
+
+    def _heartbeat(self) -> None:
+        while not self._closed.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                self._broadcast(self._line({"type": "heartbeat", "seq": self.seq}))
+
+    def close(self) -> None:
+        self._closed.set()
+        self._unsubscribe()
+        self._server.close()
+        with self._lock:
+            self._broadcast(None)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def _with_next_id(owner, attribute: str, entity_id: int, create):
+    """Создаёт сущность с тем же ID, что у писателя: счётчик ставится на entity_id и затем не уменьшается"""
+    next_id = getattr(owner, attribute)
+    setattr(owner, attribute, entity_id)
+    try:
+        return create()
+    finally:
+        setattr(owner, attribute, max(next_id, entity_id + 1))
+
+
+def apply_event(bookstore: BookStore, event: changes.ChangeEvent) -> None:
+    """Повторяет изменение писателя на копии магазина. Неизвестные события пропускаются"""
+    data = event.data
+    if event.type == changes.AUTHOR_ADDED:
+        _with_next_id(bookstore.catalog, "next_author_id", event.entity_id,
+                      lambda: bookstore.add_author(data["name"], data["country"]))
+    elif event.type == changes.BOOK_ADDED:
+        author = bookstore.find_author(data["author_id"])
+        _with_next_id(bookstore.catalog, "next_book_id", event.entity_id,
+                      lambda: bookstore.add_book(data["title"], author, data["price"], data["genre"]))
+    elif event.type == changes.BOOK_DELETED:
+        bookstore.delete_book(event.entity_id)
+    elif event.type == changes.BOOK_PRICE_CHANGED:
+        if data["scope"] == "catalog":
+            bookstore.apply_discount(event.entity_id, data["discount"])
+        else:
+            bookstore.set_price_override(event.entity_id, data["price"])
+    elif event.type == changes.CUSTOMER_ADDED:
+        _with_next_id(bookstore, "_next_customer_id", event.entity_id,
+                      lambda: bookstore.add_customer(data["name"], data["email"], data["balance"]))
+    elif event.type == changes.BALANCE_CHANGED:
+        # Списание и возврат по заказу повторяются вместе со сменой статуса
+        if data["reason"] == "topup":
+            bookstore.add_funds(event.entity_id, data["amount"])
+        elif data["reason"] not in ("order", "order_refund"):
+            bookstore.apply_credits([event.entity_id], [data["amount"]], data["reason"])
+    elif event.type == changes.ORDER_CREATED:
+        customer = bookstore.find_customer(data["customer_id"])
+        order = Order.from_line_items(event.entity_id, customer, data["book_ids"], data["prices"],
+                                      data["created_at"], OrderStatus.CREATED, data["total_price"])
+        bookstore._before_change(customer)
+        bookstore.orders.append(order)
+        bookstore._index_order(order)
+        bookstore._next_order_id = max(bookstore._next_order_id, event.entity_id + 1)
+    elif event.type == changes.ORDER_STATUS_CHANGED:
+        status = OrderStatus.parse(data["status"])
+        if status == OrderStatus.COMPLETED:
+            bookstore.process_order(event.entity_id)
+        elif status == OrderStatus.CANCELLED:
+            bookstore.cancel_order(event.entity_id)
+
+
+class Follower:
+    """Реплика: копия магазина, которая догоняет писателя по событиям из сокета.
+    Запросы к bookstore выполняются под lock - события применяются в фоновом потоке под ним же"""
+    def __init__(self, data_dir: str, socket_path: str) -> None:
+        self.data_dir = data_dir
+        self.socket_path = socket_path
+        self.shared = SharedDataDir(data_dir)
+        self.lock = threading.Lock()
+        self.bookstore = BookStore()
+        self.version = 0
+        # Номер последнего применённого события и последний известный номер у писателя
+        self.applied_seq = 0
+        self.primary_seq = 0
+        # Когда реплика последний раз точно совпадала с писателем
+        self.current_at = 0.0
+        self.connected = False
+        self.errors: list[str] = []
+        self._reader: threading.Thread | None = None
+
+    def _load_snapshot(self) -> None:
+        json_file = os.path.join(self.data_dir, "books.json")
+        xml_file = os.path.join(self.data_dir, "books.xml")
+        with self.shared.lock():
+            version = self.shared._read_state()["version"]
+            if os.path.exists(json_file):
+                bookstore = FileHandler.load_from_json_file(json_file)
+            elif os.path.exists(xml_file):
+                bookstore = FileHandler.load_from_xml_file(xml_file)
+            else:
+                bookstore = BookStore()
+        with self.lock:
+            self.bookstore = bookstore
+            self.version = version
+
+    def start(self, timeout: float = 10.0) -> None:
+        """Загружает снимок и подключается к писателю; события применяются в фоне.
+        Если писатель успел сохранить данные между загрузкой и подключением, снимок перечитывается"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self._load_snapshot()
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(self.socket_path)
+            stream = connection.makefile('r', encoding='utf-8')
+            hello = json.loads(stream.readline())
+            if hello["version"] == self.version:
+                break
+            stream.close()
+            connection.close()
+            if time.monotonic() > deadline:
+                raise TimeoutError("Реплика не успела загрузить актуальный снимок")
+        self.applied_seq = self.primary_seq = hello["base"]
+        self.current_at = time.time()
+        self.connected = True
+        self._reader = threading.Thread(target=self._follow, args=(connection, stream), daemon=True)
+        self._reader.start()
+
+    def _follow(self, connection: socket.socket, stream) -> None:
+        with connection, stream:
+            for line in stream:
+                message = json.loads(line)
+                if message["type"] == "event":
+                    self.primary_seq = message["seq"]
+                    event = changes.ChangeEvent.from_dict(message["event"])
+                    with self.lock:
+                        try:
+                            apply_event(self.bookstore, event)
+                        except Exception as error:
+                            self.errors.append(f"событие {message['seq']}: {error}")
+                    self.applied_seq = message["seq"]
+                elif message["type"] == "heartbeat":
+                    self.primary_seq = max(self.primary_seq, message["seq"])
+                elif message["type"] == "resync":
+                    break
+                if self.applied_seq == self.primary_seq:
+                    self.current_at = time.time()
+            else:
+                self.connected = False
+                return
+        # Писатель заменил магазин - перечитываем снимок и подключаемся заново
+        try:
+            self.start()
+        except Exception as error:
+            self.connected = False
+            self.errors.append(f"переподключение: {error}")
+
+    def lag(self) -> dict:
+        """Отставание от писателя: в событиях и в секундах с момента, когда реплика была актуальной"""
+        return {
+            "events": self.primary_seq - self.applied_seq,
+            "seconds": time.time() - self.current_at,
+            "connected": self.connected,
+        }
+
+
+class FollowerRunner(ScriptRunner):
+    """Пакетный режим реплики: только команды чтения и lag"""
+    READ_ONLY_COMMANDS = ("search", "bestsellers")
+
+    def __init__(self, follower: Follower) -> None:
+        super().__init__(follower.bookstore)
+        self.follower = follower
+        self.commands = {name: self.commands[name] for name in self.READ_ONLY_COMMANDS}
+        self.commands["list-books"] = (self.list_books, "[ЖАНР] [СТРАНИЦА]")
+        self.commands["order-stats"] = (self.order_stats, "")
+        self.commands["lag"] = (self.lag, "")
+
+    def list_books(self, genre: str = "", page: str = "1") -> str:
+        books, total = self.bookstore.filter_books(genre or None, page=int(page))
+        return f"Всего {total}: " + "; ".join(f"{book.book_id} {book.title}" for book in books)
+
+    def order_stats(self) -> str:
+        counts = self.bookstore.count_orders_by_status()
+        return ", ".join(f"{status}: {count}" for status, count in counts.items())
+
+    def lag(self) -> str:
+        lag = self.follower.lag()
+        state = "подключена" if lag["connected"] else "отключена"
+        return f"Отставание: {lag['events']} событий, {lag['seconds']:.1f} с ({state})"
+
+    def run_line(self, line_number: int, line: str) -> str | None:
+        with self.follower.lock:
+            # После перечитывания снимка у реплики новый магазин
+            self.bookstore = self.follower.bookstore
+            return super().run_line(line_number, line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Реплика магазина только для чтения")
+    parser.add_argument("socket", help="Unix-сокет писателя (main.py --replicate)")
+    parser.add_argument("--data", default="data", help="папка данных писателя")
+    args = parser.parse_args()
+
+    follower = Follower(args.data, args.socket)
+    follower.start()
+    runner = FollowerRunner(follower)
+    runner.run(sys.stdin)
+    print("\n".join(runner.report()), file=sys.stderr)
@@ -0,0 +1,135 @@
+import contextlib
+import inspect
+import os
+import shlex
+import sys
+import time
+from models import BookStore
+"""Пакетный режим: команды из файла или stdin выполняются прямо над BookStore, без меню.
+Одна команда на строку, аргументы с пробелами - в кавычках, # - комментарий:
+    add-author "Лев Толстой" Россия
+    add-book "Война и мир" 1 500 Роман
+    add-customer "Иван Иванов" ivan@mail.ru 2000
+    create-order 1 1 2
+    process-order 1"""
+
+
+class ScriptRunner:
+    """Выполняет команды и копит время по каждой команде"""
+    def __init__(self, bookstore: BookStore) -> None:
+        self.bookstore = bookstore
+        # команда -> (обработчик, подсказка по аргументам)
+        self.commands = {
+            "add-author": (self.add_author, "ИМЯ [СТРАНА]"),
+            "add-book": (self.add_book, "НАЗВАНИЕ ID_АВТОРА ЦЕНА [ЖАНР]"),
+            "add-customer": (self.add_customer, "ИМЯ EMAIL [БАЛАНС]"),
+            "add-funds": (self.add_funds, "ID_ПОКУПАТЕЛЯ СУММА"),
+            "create-order": (self.create_order, "ID_ПОКУПАТЕЛЯ ID_КНИГИ..."),
+            "process-order": (self.process_order, "ID_ЗАКАЗА"),
+            "cancel-order": (self.cancel_order, "ID_ЗАКАЗА"),
+            "delete-book": (self.delete_book, "ID_КНИГИ"),
+            "discount": (self.discount, "ID_КНИГИ ПРОЦЕНТ"),
+            "search": (self.search, "ЗАПРОС"),
+            "bestsellers": (self.bestsellers, "[N]"),
+        }
+        # команда -> [сколько раз, суммарное время в секундах]
+        self.timings: dict[str, list] = {}
+        self.errors: list[str] = []
+
+    # Команды. Возвращают строку для вывода
+    def add_author(self, name: str, country: str = "Неизвестно") -> str:
+        author = self.bookstore.add_author(name, country)
+        return f"Автор {author.author_id}: {author.name}"
+
+    def add_book(self, title: str, author_id: str, price: str, genre: str = "Не указан") -> str:
+        author = self.bookstore.find_author(int(author_id))
+        book = self.bookstore.add_book(title, author, float(price), genre)
+        return f"Книга {book.book_id}: {book.title}"
+
+    def add_customer(self, name: str, email: str, balance: str = "0") -> str:
+        customer = self.bookstore.add_customer(name, email, float(balance))
+        return f"Покупатель {customer.customer_id}: {customer.name}"
+
+    def add_funds(self, customer_id: str, amount: str) -> str:
+        customer = self.bookstore.add_funds(int(customer_id), float(amount))
+        return f"Баланс покупателя {customer.customer_id}: {customer.balance}"
+
+    def create_order(self, customer_id: str, *book_ids: str) -> str:
+        order = self.bookstore.create_order(int(customer_id), [int(book_id) for book_id in book_ids])
+        return f"Заказ {order.order_id}: {order.total_price} руб."
+
+    def process_order(self, order_id: str) -> str:
+        if not self.bookstore.process_order(int(order_id)):
+            raise ValueError(f"Заказ {order_id} не обработан (статус или баланс)")
+        return f"Заказ {order_id} оплачен"
+
+    def cancel_order(self, order_id: str) -> str:
+        if not self.bookstore.cancel_order(int(order_id)):
+            raise ValueError(f"Заказ {order_id} нельзя отменить")
+        return f"Заказ {order_id} отменён"
+
+    def delete_book(self, book_id: str) -> str:
+        book = self.bookstore.delete_book(int(book_id))
+        return f"Книга {book.book_id} удалена"
+
+    def discount(self, book_id: str, percent: str) -> str:
+        book = self.bookstore.apply_discount(int(book_id), float(percent))
+        return f"Цена книги {book.book_id}: {self.bookstore.get_price(book)}"
+
+    def search(self, *words: str) -> str:
+        results = self.bookstore.search_books(" ".join(words))
+        return "; ".join(f"{book.book_id} {book.title}" for book, _ in results) or "Ничего не найдено"
+
+    def bestsellers(self, n: str = "10") -> str:
+        books = self.bookstore.get_bestsellers(int(n))
+        return "; ".join(f"{book.book_id} {book.title}" for book in books) or "Продаж нет"
+
+    # Выполнение
+    def run_line(self, line_number: int, line: str) -> str | None:
+        """Выполняет одну строку скрипта. Пустые строки и комментарии пропускаются"""
+        try:
+            words = shlex.split(line, comments=True)
+        except ValueError as error:
+            self.errors.append(f"строка {line_number}: {error}")
+            return None
+        if not words:
+            return None
+        name, args = words[0], words[1:]
+        if name not in self.commands:
+            self.errors.append(f"строка {line_number}: неизвестная команда {name}")
+            return None
+
+        handler, usage = self.commands[name]
+        try:
+            inspect.signature(handler).bind(*args)
+        except TypeError:
+            self.errors.append(f"строка {line_number}: использование: {name} {usage}")
+            return None
+
+        started = time.perf_counter()
+        try:
+            result = handler(*args)
+        except Exception as error:
+            result = None
+            self.errors.append(f"строка {line_number}: {name}: {error}")
+        timing = self.timings.setdefault(name, [0, 0.0])
+        timing[0] += 1
+        timing[1] += time.perf_counter() - started
+        return result
+
+    def run(self, lines, echo: bool = True) -> None:
+        output = sys.stdout
+        # Модели печатают отладочные сообщения - в пакетном режиме они не нужны
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for line_number, line in enumerate(lines, 1):
+                result = self.run_line(line_number, line)
+                if echo and result is not None:
+                    print(result, file=output)
+
+    def report(self) -> list[str]:
+        lines = [f"{'команда':<16}{'раз':>8}{'всего мс':>12}{'среднее мс':>12}"]
+        for name, (count, total) in sorted(self.timings.items()):
+            lines.append(f"{name:<16}{count:>8}{total * 1000:>12.2f}{total / count * 1000:>12.3f}")
+        lines.append(f"Ошибок: {len(self.errors)}")
+        lines.extend(f"  {error}" for error in self.errors)
+        return lines
@@ -0,0 +1,159 @@
+import copy
+"""Снимки состояния магазина для долгих чтений (сохранение, отчёты, списки)"""
+
+
+def _copy_entity(entity):
+    """Копия объекта для снимка. Список покупок копируем отдельно, он меняется на месте"""
+    entity_copy = copy.copy(entity)
+    if hasattr(entity, "purchased_books"):
+        entity_copy.purchased_books = list(entity.purchased_books)
+    return entity_copy
+
+
+class SnapshotSequence:
+    """Список объектов магазина на момент снимка. Элементы разрешаются при обращении:
+    сначала копируем живой объект, потом смотрим, не сохранил ли писатель его старую версию.
+    Писатель сохраняет старую версию до изменения, поэтому такой порядок даёт согласованное чтение"""
+    def __init__(self, snapshot: "StoreSnapshot", name: str, live: list, length: int) -> None:
+        self._snapshot = snapshot
+        self._name = name
+        self._live = live
+        self._length = length
+
+    def _resolve(self, entity):
+        entity_copy = _copy_entity(entity)
+        preserved = self._snapshot._preserved.get(id(entity))
+        return preserved[1] if preserved is not None else entity_copy
+
+    def _base(self, index):
+        # Сначала сохранённый список: после удаления живой список короче снимка
+        preserved_list = self._snapshot._preserved_lists.get(self._name)
+        if preserved_list is not None:
+            return preserved_list[index]
+        try:
+            items = self._live[index]
+        except IndexError:
+            items = None
+        # Писатель мог изменить список, пока мы читали - тогда верен сохранённый
+        preserved_list = self._snapshot._preserved_lists.get(self._name)
+        if preserved_list is not None:
+            return preserved_list[index]
+        if items is None:
+            raise IndexError(index)
+        return items
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._resolve(entity) for entity in self._base(slice(*index.indices(self._length)))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self._resolve(self._base(index))
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+
+class StoreSnapshot:
+    """Согласованный вид магазина на момент version. Создаётся за O(1):
+    запоминаем длины списков, а старые версии объектов сохраняют писатели при изменении.
+    Для чтения снимок ведёт себя как BookStore (books, authors, customers, orders, get_price)"""
+    def __init__(self, bookstore) -> None:
+        self.version = bookstore.version
+        self._bookstore = bookstore
+        # id(живой объект) -> (объект, его копия на момент снимка); объект держим, чтобы id не переиспользовался
+        self._preserved: dict[int, tuple] = {}
+        self._preserved_lists: dict[str, list] = {}
+        self._price_overrides: dict[int, float] | None = None
+        self._lengths = {
+            "books": len(bookstore.books),
+            "authors": len(bookstore.authors),
+            "customers": len(bookstore.customers),
+            "orders": len(bookstore.orders),
+        }
+        self._next_book_id = bookstore._next_book_id
+        self._next_author_id = bookstore._next_author_id
+        self._next_customer_id = bookstore._next_customer_id
+        self._next_order_id = bookstore._next_order_id
+
+    # Вызывается писателем до изменения
+    def _preserve(self, entity) -> None:
+        if id(entity) not in self._preserved:
+            self._preserved[id(entity)] = (entity, _copy_entity(entity))
+
+    def _preserve_list(self, name: str, live: list) -> None:
+        if name not in self._preserved_lists:
+            self._preserved_lists[name] = list(live[:self._lengths[name]])
+
+    def _preserve_price_overrides(self, overrides: dict[int, float]) -> None:
+        if self._price_overrides is None:
+            self._price_overrides = dict(overrides)
+
+    # Чтение
+    @property
+    def books(self) -> SnapshotSequence:
+        return SnapshotSequence(self, "books", self._bookstore.books, self._lengths["books"])
+
+    @property
+    def authors(self) -> SnapshotSequence:
+        return SnapshotSequence(self, "authors", self._bookstore.authors, self._lengths["authors"])
+
+    @property
+    def customers(self) -> SnapshotSequence:
+        return SnapshotSequence(self, "customers", self._bookstore.customers, self._lengths["customers"])
+
+    @property
+    def orders(self) -> SnapshotSequence:
+        return SnapshotSequence(self, "orders", self._bookstore.orders, self._lengths["orders"])
+
+    def get_price(self, book) -> float:
+        """Цена книги в магазине на момент снимка"""
+        price = self._bookstore.price_overrides.get(book.book_id, book.price)
+        if self._price_overrides is not None:
+            return self._price_overrides.get(book.book_id, book.price)
+        return price
+
+    def release(self) -> None:
+        """Снимок больше не нужен - писатели перестают сохранять для него старые версии"""
+        self._bookstore._snapshots.discard(self)
+        self._preserved.clear()
+        self._preserved_lists.clear()
+
+    def __enter__(self) -> "StoreSnapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+if __name__ == "__main__":
+    # Проверка: снимок, удаление книги, затем перебор и сохранение из снимка
+    import contextlib
+    import io
+    import os
+    import tempfile
+    from models import BookStore
+    from file_handlers import FileHandler
+
+    store = BookStore()
+    with contextlib.redirect_stdout(io.StringIO()):
+        author = store.add_author("Автор")
+        books = [store.add_book(f"Книга {i}", author, 100.0 + i) for i in range(8)]
+    with store.snapshot() as snapshot:
+        for book in books[:4]:
+            store.delete_book(book.book_id)
+        assert [book.book_id for book in snapshot.books] == [book.book_id for book in books]
+        assert snapshot.books[-1].book_id == books[-1].book_id
+        with tempfile.TemporaryDirectory() as directory:
+            FileHandler.save_to_json_file(snapshot, os.path.join(directory, "books.json"))
+            FileHandler.save_to_xml_file(snapshot, os.path.join(directory, "books.xml"))
+    assert [book.book_id for book in store.books] == [book.book_id for book in books[4:]]
+    print("Снимки: проверка пройдена")
@@ -0,0 +1,96 @@
+import heapq
+import math
+import re
+from collections import Counter
+"""Полнотекстовый поиск по книгам с ранжированием BM25"""
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Окончания для простого стемминга, длинные проверяем первыми
+RUSSIAN_ENDINGS = sorted((
+    "иями", "ями", "ами", "ией", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ия", "ии", "ой", "ей", "ий", "ый",
+    "ом", "ем", "ам", "ям", "ах", "ях", "ов", "ев", "ию", "ья", "ье",
+    "ь", "а", "я", "о", "е", "ы", "и", "у", "ю", "й",
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+
+def stem(token: str) -> str:
+    """Отрезает самое длинное подходящее окончание, если останется хотя бы 3 буквы"""
+    for ending in RUSSIAN_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= MIN_STEM_LENGTH:
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Приводит текст к нижнему регистру (ё = е) и разбивает на основы слов"""
+    text = text.casefold().replace("ё", "е")
+    return [stem(token) for token in TOKEN_RE.findall(text)]
+
+
+class FullTextIndex:
+    """Инвертированный индекс: термин -> {doc_id: сколько раз встречается}"""
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self) -> None:
+        self.postings: dict[str, dict[int, int]] = {}
+        self.doc_lengths: dict[int, int] = {}
+        self.total_length = 0
+
+    def add_document(self, doc_id: int, text: str) -> None:
+        """Индексирует документ (при повторном добавлении старая версия заменяется)"""
+        self.remove_document(doc_id)
+        terms = tokenize(text)
+        for term, count in Counter(terms).items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.doc_lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+
+    def remove_document(self, doc_id: int, text: str | None = None) -> None:
+        """Убирает документ. Если текст известен, чистим только его термины"""
+        if doc_id not in self.doc_lengths:
+            return
+        terms = set(tokenize(text)) if text is not None else list(self.postings)
+        for term in terms:
+            doc_ids = self.postings.get(term)
+            if doc_ids is not None and doc_ids.pop(doc_id, None) is not None and not doc_ids:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, k: int = 10) -> list[tuple[int, float]]:
+        """Топ-k документов по BM25: [(doc_id, оценка)]"""
+        doc_count = len(self.doc_lengths)
+        if not doc_count:
+            return []
+        average_length = self.total_length / doc_count
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            doc_ids = self.postings.get(term)
+            if not doc_ids:
+                continue
+            idf = math.log(1 + (doc_count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            for doc_id, frequency in doc_ids.items():
+                length_norm = 1 - self.B + self.B * self.doc_lengths[doc_id] / average_length
+                score = idf * frequency * (self.K1 + 1) / (frequency + self.K1 * length_norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+        # Куча на k элементов вместо сортировки всех совпадений
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def to_dict(self) -> dict:
+        return {
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FullTextIndex":
+        """Восстанавливает индекс из словаря (ключи JSON приходят строками)"""
+        index = cls()
+        index.postings = {term: {int(doc_id): count for doc_id, count in doc_ids.items()}
+                          for term, doc_ids in data["postings"].items()}
+        index.doc_lengths = {int(doc_id): length for doc_id, length in data["doc_lengths"].items()}
+        index.total_length = sum(index.doc_lengths.values())
+        return index
@@ -0,0 +1,95 @@
+"""Список с удалением за O(1): удалённый элемент помечается надгробием, а не сдвигает хвост"""
+
+# Порог доли надгробий, после которого список уплотняется
+COMPACT_RATIO = 0.25
+
+# Метка удалённого слота
+_DEAD = object()
+
+
+class TombstoneList:
+    """Список объектов с удалением за O(1).
+    remove помечает слот надгробием, перебор пропускает мёртвые слоты. Когда надгробий
+    становится больше COMPACT_RATIO, список уплотняется - в среднем это O(1) на удаление.
+    Доступ по индексу и срезы сначала уплотняют список, чтобы индексы совпадали с обычным списком"""
+    __slots__ = ("_slots", "_positions", "_dead")
+
+    def __init__(self, items=()) -> None:
+        self._slots: list = []
+        # id(объект) -> номер слота или список номеров, если объект лежит в списке несколько раз
+        self._positions: dict[int, int | list[int]] = {}
+        self._dead = 0
+        self.extend(items)
+
+    def append(self, item) -> None:
+        key = id(item)
+        slot = len(self._slots)
+        self._slots.append(item)
+        position = self._positions.get(key)
+        if position is None:
+            self._positions[key] = slot
+        elif isinstance(position, list):
+            position.append(slot)
+        else:
+            self._positions[key] = [position, slot]
+
+    def extend(self, items) -> None:
+        for item in items:
+            self.append(item)
+
+    def remove(self, item) -> None:
+        """Удаляет одно вхождение item. ValueError, если его нет"""
+        key = id(item)
+        position = self._positions.get(key)
+        if position is None:
+            raise ValueError("TombstoneList.remove(x): x not in list")
+        if isinstance(position, list):
+            slot = position.pop()
+            if len(position) == 1:
+                self._positions[key] = position[0]
+        else:
+            slot = position
+            del self._positions[key]
+        self._slots[slot] = _DEAD
+        self._dead += 1
+        if self._dead > COMPACT_RATIO * len(self._slots):
+            self.compact()
+
+    def compact(self) -> None:
+        """Убирает надгробия. Порядок живых элементов сохраняется"""
+        if not self._dead:
+            return
+        items = [item for item in self._slots if item is not _DEAD]
+        self._slots = []
+        self._positions = {}
+        self._dead = 0
+        self.extend(items)
+
+    @property
+    def dead_ratio(self) -> float:
+        return self._dead / len(self._slots) if self._slots else 0.0
+
+    def clear(self) -> None:
+        self._slots.clear()
+        self._positions.clear()
+        self._dead = 0
+
+    def __iter__(self):
+        # Фильтруем всегда: remove во время перебора ставит надгробие в ещё не пройденный слот
+        return (item for item in self._slots if item is not _DEAD)
+
+    def __len__(self) -> int:
+        return len(self._slots) - self._dead
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __contains__(self, item) -> bool:
+        return id(item) in self._positions
+
+    def __getitem__(self, index):
+        self.compact()
+        return self._slots[index]
+
+    def __repr__(self) -> str:
+        return f"TombstoneList({list(self)!r})"
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+"""Ограниченный LRU-кэш для готовых представлений (страницы книг, заказы, результаты поиска)"""
+
+# Сколько представлений держим по умолчанию
+VIEW_CACHE_SIZE = 10_000
+
+
+class LRUCache:
+    """Кэш на OrderedDict: при обращении запись переезжает в конец, при переполнении
+    вытесняется самая давняя. В ключ входит версия сущности, поэтому после изменения
+    старое представление просто перестаёт запрашиваться и со временем вытесняется.
+    on_evict(key) вызывается для каждой вытесненной или очищенной записи"""
+    def __init__(self, maxsize: int = VIEW_CACHE_SIZE, on_evict=None) -> None:
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._items: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_render(self, key, render):
+        """Значение из кэша или render(), которое тут же кладётся в кэш"""
+        if key in self._items:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+        self.misses += 1
+        value = render()
+        self._items[key] = value
+        if len(self._items) > self.maxsize:
+            evicted, _ = self._items.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+        return value
+
+    def clear(self) -> None:
+        keys = list(self._items) if self.on_evict is not None else ()
+        self._items.clear()
+        for key in keys:
+            self.on_evict(key)
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hit_ratio,
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)